@@ -1,18 +1,17 @@
 from flask import Flask
-from flask_cors import CORS
 from flask_mail import Mail
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
 from flask_caching import Cache
 from celery import Celery, Task
+from celery.signals import worker_process_init, celeryd_init, worker_init
 from config import get_config_class, BaseConfig
 from flask_socketio import SocketIO
+from kombu import Queue
+from redis import Redis
 
 db = SQLAlchemy()
-migrate = Migrate()
 socketio = SocketIO()
 cache = Cache()
-cors = CORS()
 mail = Mail()
 
 
@@ -25,35 +24,126 @@ def celery_init_app(app: Flask) -> Celery:
     celery = Celery(app.name, task_cls=FlaskTask)
     celery.config_from_object(app.config['CELERY'])
     celery.set_default()
+
+    @celeryd_init.connect(weak=False, dispatch_uid='configure_queues')
+    def configure_queues(conf, options, **kwargs):
+        # число процессов обработчика, запущенного без --concurrency, складывается из настроек его очередей
+        queues = options.get('queues') or list(app.config['CELERY_QUEUES'])
+        if isinstance(queues, str):
+            queues = queues.split(',')
+        if not options.get('concurrency'):
+            conf.worker_concurrency = sum(app.config['CELERY_QUEUES'].get(queue, 1) for queue in queues)
+
+    @worker_init.connect(weak=False, dispatch_uid='start_metrics_server')
+    def start_metrics(**kwargs):
+        if app.config['METRICS_PORT']:
+            from app.metrics import start_metrics_server
+            app.extensions['metrics_server'] = start_metrics_server(app.config['METRICS_PORT'])
+
+    @worker_process_init.connect(weak=False, dispatch_uid='dispose_engine')
+    def dispose_engine(**kwargs):
+        with app.app_context():
+            db.engine.dispose(close=False)
+
     app.extensions['celery'] = celery
     return celery
 
 
+def redis_init_app(app: Flask) -> Redis:
+    options = {'decode_responses': True}
+    if app.config['REDIS_PASSWORD']:
+        options['password'] = app.config['REDIS_PASSWORD']
+    redis = Redis.from_url(app.config['REDIS_URL'], **options)
+    app.extensions['redis'] = redis
+    return redis
+
+
+def celery_config(app: Flask) -> dict:
+    """Настройки Celery, общие для веб-приложения и обработчика задач"""
+    return {
+        "broker_url": app.config['REDIS_URL'],
+        "result_backend": app.config['REDIS_URL'],
+        "task_ignore_results": True,
+        "broker_connection_retry_on_startup": True,
+        "broker_pool_limit": app.config['CELERY_BROKER_POOL_LIMIT'],
+        "broker_transport_options": {
+            'visibility_timeout': 3600,
+            'fanout_prefix': True,
+            'fanout_patterns': True,
+            'max_connections': app.config['CELERY_BROKER_MAX_CONNECTIONS'],
+            # очереди опрашиваются в порядке, указанном при запуске обработчика, а не по кругу
+            'queue_order_strategy': 'priority',
+            'password': app.config['REDIS_PASSWORD']
+        },
+        # модуль задач импортируется при запуске обработчика, а не через представления веб-приложения
+        "imports": ("app.tasks",),
+        "task_default_queue": "default",
+        "task_queues": [Queue(name) for name in app.config['CELERY_QUEUES']],
+        "task_routes": {
+            "app.tasks.send_user_email": {"queue": "auth-critical"},
+            "app.tasks.send_email": {"queue": "email-bulk"},
+            "app.tasks.flush_last_seen": {"queue": "maintenance"},
+            "app.tasks.reap_expired_sessions": {"queue": "maintenance"},
+            "app.tasks.prune_change_log": {"queue": "maintenance"},
+            "app.tasks.collect_media_garbage": {"queue": "maintenance"},
+            "app.tasks.*recommend*": {"queue": "recommendations"},
+        },
+        # процесс не забирает задачи впрок, поэтому длинная задача не задерживает очередь за собой
+        "worker_prefetch_multiplier": 1,
+        "beat_schedule": {
+            "flush-last-seen": {
+                "task": "app.tasks.flush_last_seen",
+                "schedule": app.config['LAST_SEEN_INTERVAL']
+            },
+            "reap-expired-sessions": {
+                "task": "app.tasks.reap_expired_sessions",
+                "schedule": app.config['SESSION_REAPER_INTERVAL']
+            },
+            "prune-change-log": {
+                "task": "app.tasks.prune_change_log",
+                "schedule": app.config['SYNC_PRUNE_INTERVAL']
+            },
+            "collect-media-garbage": {
+                "task": "app.tasks.collect_media_garbage",
+                "schedule": app.config['MEDIA_GC_INTERVAL']
+            }
+        }
+    }
+
+
+def create_worker_app(config_class: BaseConfig = get_config_class()) -> Flask:
+    """Приложение для обработчиков Celery и beat: без CORS, Socket.IO, представлений и сервисов"""
+    app = Flask(__name__)
+    app.config.from_object(config_class)
+    app.config.from_mapping(CELERY=celery_config(app))
+    config_class.init_app(app)
+    db.init_app(app)
+    cache.init_app(app)
+    mail.init_app(app)
+    redis_init_app(app)
+    app.config.from_prefixed_env()
+    celery_init_app(app)
+    return app
+
+
 def create_app(config_class: BaseConfig = get_config_class()) -> Flask:
     app = Flask(__name__)
     app.config.from_object(config_class)
-    app.config.from_mapping(
-        CELERY={
-            "broker_url": app.config['REDIS_URL'],
-            "result_backend": app.config['REDIS_URL'],
-            "task_ignore_results": True,
-            "broker_connection_retry_on_startup": True,
-            "broker_transport_options": {
-                'visibility_timeout': 3600,
-                'fanout_prefix': True,
-                'fanout_patterns': True,
-                'max_connections': 1,
-                'password': app.config['REDIS_PASSWORD']
-            }
-        }
-    )
+    app.config.from_mapping(CELERY=celery_config(app))
     config_class.init_app(app)
-    cors.init_app(app, origins=[app.config['APP_URL']], supports_credentials=True)
+    # расширения, нужные только веб-приложению, импортируются здесь, чтобы не замедлять запуск обработчиков задач
+    from flask_cors import CORS
+    from flask_migrate import Migrate
+    CORS(app, origins=[app.config['APP_URL']], supports_credentials=True)
     db.init_app(app)
-    migrate.init_app(app, db)
-    socketio.init_app(app, cors_allowed_origins=app.config['APP_URL'])
+    Migrate(app, db)
+    # обработчики Socket.IO должны быть зарегистрированы до создания сервера, чтобы попасть в каждое приложение
+    from app.messages import view as messages_view  # noqa: F401
+    socketio.init_app(app, cors_allowed_origins=app.config['APP_URL'],
+                      message_queue=app.config['SOCKETIO_MESSAGE_QUEUE'], channel=app.config['SOCKETIO_CHANNEL'])
     cache.init_app(app)
     mail.init_app(app)
+    redis_init_app(app)
     app.config.from_prefixed_env()
     celery_init_app(app)
     from app.errors import bp as errors_bp
@@ -66,43 +156,64 @@ def create_app(config_class: BaseConfig = get_config_class()) -> Flask:
     from app.communities.view import CommunitiesAPI, CommunityAPI, MembersAPI
     from app.users.view import UsersAPI, UserAPI, FriendsAPI
     from app.vacancies.view import VacancyApi, VacanciesAPI
-    from app.messages.view import MessagesAPI
+    from app.messages.view import MessagesAPI, ConversationsAPI, ConversationAPI
     from app.posts.view import PostAPI, PostsAPI, LikesAPI
+    from app.sync.view import SyncAPI
+    from app.media.view import PresignAPI, ImageAPI
+    from app.uploads.view import UploadsAPI, UploadAPI
 
     from app.auth.service import AuthService
     from app.comments.repository import CommentRepository
     from app.comments.service import CommentService
     from app.communities.service import CommunityService
-    from app.messages.repository import MessageRepository
+    from app.messages.repository import MessageRepository, ConversationRepository
     from app.messages.service import MessageService
     from app.users.repository import UserRepository
     from app.posts.repository import PostRepository
     from app.communities.repository import CommunityRepository
     from app.posts.service import PostService
+    from app.sync.repository import ChangeRepository
+    from app.sync.service import SyncService
+    from app.media.repository import DiskRenditionCache
+    from app.media.service import MediaService
+    from app.uploads.repository import UploadRepository
+    from app.uploads.service import UploadService
     from app.users.service import UserService
     from app.vacancies.repository import VacancyRepository
     from app.vacancies.service import VacancyService
-    from app.auth.repository import SessionRepository
+    from app.auth.repository import (SessionRepository, RedisSessionRepository, RedisTwoFactorRepository,
+                                     MemoryTwoFactorRepository)
 
-    message_repo = MessageRepository()
+    conversation_repo = ConversationRepository()
+    message_repo = MessageRepository(conversation_repo)
     user_repo = UserRepository()
     post_repo = PostRepository()
     community_repo = CommunityRepository()
     comment_repo = CommentRepository()
-    session_repo = SessionRepository()
+    session_repo = RedisSessionRepository() if app.config['SESSION_STORE'] == 'redis' else SessionRepository()
     vacancy_repo = VacancyRepository()
+    upload_repo = UploadRepository()
+    two_factor_repo = RedisTwoFactorRepository() if app.config['TWO_FACTOR_STORE'] == 'redis' \
+        else MemoryTwoFactorRepository()
 
     app.user_repo = user_repo
 
-    message_service = MessageService(message_repo, user_repo)
-    post_service = PostService(post_repo, user_repo, community_repo)
-    user_service = UserService(user_repo)
+    message_service = MessageService(message_repo, user_repo, conversation_repo)
+    post_service = PostService(post_repo, user_repo, community_repo, upload_repo)
+    user_service = UserService(user_repo, upload_repo)
     comment_service = CommentService(comment_repo, post_repo, user_repo)
-    auth_service = AuthService(user_repo, session_repo)
+    auth_service = AuthService(user_repo, session_repo, two_factor_repo)
     vacancy_servie = VacancyService(vacancy_repo, user_repo)
-    community_service = CommunityService(community_repo, user_repo)
+    community_service = CommunityService(community_repo, user_repo, upload_repo)
+    sync_service = SyncService(ChangeRepository())
+    rendition_cache = DiskRenditionCache(app.config['IMAGE_CACHE_FOLDER'], app.config['IMAGE_CACHE_SIZE'])
+    media_service = MediaService(rendition_cache, upload_repo)
+    upload_service = UploadService(upload_repo)
 
     app.add_url_rule(f"{prefix}/messages", view_func=MessagesAPI.as_view("messages", message_service))
+    app.add_url_rule(f"{prefix}/conversations", view_func=ConversationsAPI.as_view("conversations", message_service))
+    app.add_url_rule(f"{prefix}/conversations/<string:username>",
+                     view_func=ConversationAPI.as_view("conversation", message_service))
     app.add_url_rule(f"{prefix}/posts", view_func=PostsAPI.as_view("posts", post_service))
     app.add_url_rule(f"{prefix}/posts/<int:post_id>", view_func=PostAPI.as_view("post", post_service))
     app.add_url_rule(f"{prefix}/likes/<int:post_id>", view_func=LikesAPI.as_view("like", post_service))
@@ -126,5 +237,10 @@ def create_app(config_class: BaseConfig = get_config_class()) -> Flask:
     app.add_url_rule(f"{prefix}/sessions/<session_id>", view_func=SessionAPI.as_view("session", auth_service))
     app.add_url_rule(f"{prefix}/email", view_func=EmailAPI.as_view("email", auth_service))
     app.add_url_rule(f"{prefix}/two-factor", view_func=TwoFactorAPI.as_view("two-factor", auth_service))
+    app.add_url_rule(f"{prefix}/sync", view_func=SyncAPI.as_view("sync", sync_service))
+    app.add_url_rule(f"{prefix}/media/presign", view_func=PresignAPI.as_view("presign", media_service))
+    app.add_url_rule(f"{prefix}/img/<path:key>", view_func=ImageAPI.as_view("image", media_service))
+    app.add_url_rule(f"{prefix}/uploads", view_func=UploadsAPI.as_view("uploads", upload_service))
+    app.add_url_rule(f"{prefix}/uploads/<uuid:upload_id>", view_func=UploadAPI.as_view("upload", upload_service))
 
     return app
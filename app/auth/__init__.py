@@ -2,6 +2,7 @@ import jwt
 from flask import current_app as app, abort, g
 from flask_httpauth import HTTPTokenAuth
 
+from app.auth.utils import decode_token
 from app.models import User
 
 token_auth = HTTPTokenAuth(scheme='Bearer')
@@ -10,8 +11,11 @@ token_auth = HTTPTokenAuth(scheme='Bearer')
 @token_auth.verify_token
 def verify_token(token):
     try:
-        payload = jwt.decode(token, app.config.get('SECRET_KEY'), algorithms=["HS256"])
-        user: User = app.user_repo.get_by_id(payload["id"])
+        payload = decode_token(token)
+        if app.config['AUTH_MODE'] == 'claims':
+            user: User = app.user_repo.get_reference(payload["id"])
+        else:
+            user: User = app.user_repo.get_cached_by_id(payload["id"])
         if user:
             g.current_user = user
             app.user_repo.update_last_seen(user)
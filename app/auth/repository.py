@@ -1,12 +1,29 @@
+import math
+import threading
+import time
 import uuid
+from datetime import datetime, timezone, timedelta
+
 import sqlalchemy as sa
 import sqlalchemy.orm as so
 from abc import ABC, abstractmethod
+from flask import current_app as app, abort, url_for
 
 from app import db
 from app.models import Session, User
+from app.users.repository import UserRepository
 from app.utils import paginate
 
+REFRESH_SESSION_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+redis.call('RENAME', KEYS[1], KEYS[2])
+redis.call('ZREM', KEYS[3], ARGV[1])
+redis.call('ZADD', KEYS[3], ARGV[3], ARGV[2])
+return 1
+"""
+
 
 class SessionRepositoryInterface(ABC):
     @abstractmethod
@@ -38,6 +55,10 @@ class SessionRepositoryInterface(ABC):
     def delete_all(self, user: User) -> None:
         pass
 
+    @abstractmethod
+    def delete_expired(self, batch_size: int, max_batches: int) -> int:
+        pass
+
 
 class SessionRepository(SessionRepositoryInterface):
     def add(self, user_id: int, platform: str, ip: str) -> Session:
@@ -77,3 +98,211 @@ class SessionRepository(SessionRepositoryInterface):
     def delete_all(self, user: User) -> None:
         db.session.execute(sa.delete(Session).filter_by(user_id=user.id))
         db.session.commit()
+
+    def delete_expired(self, batch_size: int, max_batches: int) -> int:
+        """Удаление истекших сеансов пакетами, чтобы не блокировать таблицу надолго"""
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        removed = 0
+        for _ in range(max_batches):
+            expired = sa.select(Session.id).where(Session.expires < now).limit(batch_size)
+            result = db.session.execute(sa.delete(Session).where(Session.id.in_(expired.scalar_subquery())),
+                                        execution_options={'synchronize_session': False})
+            db.session.commit()
+            removed += result.rowcount
+            if result.rowcount < batch_size:
+                break
+        return removed
+
+
+class RedisSessionRepository(SessionRepositoryInterface):
+    """Сеансы в Redis: хеш на сеанс со временем жизни SESSION_LIFETIME и упорядоченное множество сеансов пользователя"""
+
+    @staticmethod
+    def session_key(session_id: uuid.UUID | str) -> str:
+        return f'session:{session_id}'
+
+    @staticmethod
+    def user_key(user_id: int) -> str:
+        return f'user:{user_id}:sessions'
+
+    def to_model(self, session_id: uuid.UUID | str, data: dict, user: User | None = None) -> Session:
+        session: Session = Session(
+            id=uuid.UUID(str(session_id)),
+            platform=data['platform'] or None,
+            ip=data['ip'],
+            user_id=int(data['user_id']),
+            created_at=datetime.fromisoformat(data['created_at']),
+            expires=datetime.fromisoformat(data['expires'])
+        )
+        session.user = user or UserRepository().get_reference(session.user_id)
+        return session
+
+    def add(self, user_id: int, platform: str, ip: str) -> Session:
+        redis = app.extensions['redis']
+        lifetime = timedelta(days=app.config['SESSION_LIFETIME'])
+        created_at = datetime.now(timezone.utc)
+        session_id = uuid.uuid4()
+        data = {
+            'user_id': user_id,
+            'platform': platform or '',
+            'ip': ip,
+            'created_at': created_at.isoformat(),
+            'expires': (created_at + lifetime).isoformat()
+        }
+        pipeline = redis.pipeline()
+        pipeline.hset(self.session_key(session_id), mapping=data)
+        pipeline.expire(self.session_key(session_id), lifetime)
+        pipeline.zadd(self.user_key(user_id), {str(session_id): created_at.timestamp()})
+        pipeline.expire(self.user_key(user_id), lifetime)
+        pipeline.execute()
+        return self.to_model(session_id, data)
+
+    def paginate(self, page: int, per_page: int, user: User,
+                 query: sa.Select[tuple[Session]] = sa.select(Session)) -> dict:
+        redis = app.extensions['redis']
+        user_key = self.user_key(user.id)
+        expired = datetime.now(timezone.utc) - timedelta(days=app.config['SESSION_LIFETIME'])
+        pipeline = redis.pipeline()
+        pipeline.zremrangebyscore(user_key, '-inf', expired.timestamp())
+        pipeline.zcard(user_key)
+        pipeline.zrevrange(user_key, (page - 1) * per_page, page * per_page - 1)
+        _, total_items, session_ids = pipeline.execute()
+        pipeline = redis.pipeline()
+        for session_id in session_ids:
+            pipeline.hgetall(self.session_key(session_id))
+        sessions = [self.to_model(session_id, data, user)
+                    for session_id, data in zip(session_ids, pipeline.execute()) if data]
+        total_pages = math.ceil(total_items / per_page)
+        return {
+            'items': [self.model_to_dict(session) for session in sessions],
+            'meta': {
+                'page': page,
+                'per_page': per_page,
+                'total_pages': total_pages,
+                'total_items': total_items
+            },
+            'links': {
+                'self': url_for('sessions', page=page, per_page=per_page),
+                'next': url_for('sessions', page=page + 1, per_page=per_page) if page < total_pages else None,
+                'prev': url_for('sessions', page=page - 1, per_page=per_page) if page > 1 else None
+            }
+        }
+
+    def refresh(self, session: Session) -> str:
+        session_id = uuid.uuid4()
+        # сеанс мог истечь или быть обновлен параллельным запросом после чтения, проверка и замена выполняются атомарно
+        refreshed = app.extensions['redis'].eval(
+            REFRESH_SESSION_SCRIPT, 3, self.session_key(session.id), self.session_key(session_id),
+            self.user_key(session.user_id), str(session.id), str(session_id), session.created_at.timestamp())
+        if not refreshed:
+            abort(401, 'Сессия не найдена, авторизуйтесь заново')
+        session.id = session_id
+        return str(session.id)
+
+    def get_by_id(self, session_id: uuid.UUID) -> Session:
+        data = app.extensions['redis'].hgetall(self.session_key(session_id))
+        if not data:
+            abort(404)
+        return self.to_model(session_id, data)
+
+    def model_to_dict(self, model: Session) -> dict:
+        data = {
+            'id': model.id,
+            'platform': model.platform,
+            'created_at': str(model.created_at or ''),
+            'ip': model.ip,
+            'user': model.user.username
+        }
+        return data
+
+    def delete(self, session: Session) -> None:
+        pipeline = app.extensions['redis'].pipeline()
+        pipeline.delete(self.session_key(session.id))
+        pipeline.zrem(self.user_key(session.user_id), str(session.id))
+        pipeline.execute()
+
+    def delete_all(self, user: User) -> None:
+        redis = app.extensions['redis']
+        session_ids = redis.zrange(self.user_key(user.id), 0, -1)
+        redis.delete(self.user_key(user.id), *[self.session_key(session_id) for session_id in session_ids])
+
+    def delete_expired(self, batch_size: int, max_batches: int) -> int:
+        """Истекшие сеансы удаляет сам Redis по TTL"""
+        return 0
+
+
+CHECK_TWO_FACTOR_CODE_SCRIPT = """
+local code = redis.call('HGET', KEYS[1], 'code')
+if not code then
+    return 0
+end
+if code == ARGV[1] then
+    redis.call('DEL', KEYS[1])
+    return 1
+end
+if redis.call('HINCRBY', KEYS[1], 'attempts', 1) >= tonumber(ARGV[2]) then
+    redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class TwoFactorRepositoryInterface(ABC):
+    @abstractmethod
+    def add(self, user_id: int, code: int) -> None:
+        pass
+
+    @abstractmethod
+    def check(self, user_id: int, code: int) -> bool:
+        pass
+
+
+class RedisTwoFactorRepository(TwoFactorRepositoryInterface):
+    """Одноразовые коды двухфакторной аутентификации в Redis с ограниченным временем жизни и числом попыток"""
+
+    @staticmethod
+    def code_key(user_id: int) -> str:
+        return f'user:{user_id}:two_factor'
+
+    def add(self, user_id: int, code: int) -> None:
+        pipeline = app.extensions['redis'].pipeline()
+        pipeline.delete(self.code_key(user_id))
+        pipeline.hset(self.code_key(user_id), mapping={'code': str(code), 'attempts': 0})
+        pipeline.expire(self.code_key(user_id), app.config['TWO_FACTOR_CODE_LIFETIME'])
+        pipeline.execute()
+
+    def check(self, user_id: int, code: int) -> bool:
+        redis = app.extensions['redis']
+        result = redis.eval(CHECK_TWO_FACTOR_CODE_SCRIPT, 1, self.code_key(user_id), str(code),
+                            app.config['TWO_FACTOR_MAX_ATTEMPTS'])
+        return result == 1
+
+
+class MemoryTwoFactorRepository(TwoFactorRepositoryInterface):
+    """Одноразовые коды двухфакторной аутентификации в памяти процесса"""
+
+    def __init__(self):
+        self.codes: dict[int, dict] = {}
+        self.lock = threading.Lock()
+
+    def add(self, user_id: int, code: int) -> None:
+        with self.lock:
+            self.codes[user_id] = {
+                'code': code,
+                'attempts': 0,
+                'expires': time.monotonic() + app.config['TWO_FACTOR_CODE_LIFETIME']
+            }
+
+    def check(self, user_id: int, code: int) -> bool:
+        with self.lock:
+            challenge = self.codes.get(user_id)
+            if challenge is None or challenge['expires'] <= time.monotonic():
+                self.codes.pop(user_id, None)
+                return False
+            if challenge['code'] == code:
+                del self.codes[user_id]
+                return True
+            challenge['attempts'] += 1
+            if challenge['attempts'] >= app.config['TWO_FACTOR_MAX_ATTEMPTS']:
+                del self.codes[user_id]
+            return False
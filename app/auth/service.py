@@ -4,14 +4,14 @@ from datetime import datetime, timezone
 
 import jwt
 
-from app.tasks import send_email
-from flask import g, current_app as app, abort, render_template
+from app.tasks import send_user_email
+from flask import g, current_app as app, abort, url_for
 from enum import Enum
-from app.auth.repository import SessionRepositoryInterface
+from app.auth.repository import SessionRepositoryInterface, TwoFactorRepositoryInterface
 from app.auth.utils import generate_token
 from app.models import User, Session
 from app.users.repository import UserRepositoryInterface
-from app.users.utils import check_password, set_password
+from app.users.utils import check_password, set_password, needs_rehash
 import secrets
 
 
@@ -24,6 +24,7 @@ class TokenType(str, Enum):
 class AuthInterface(ABC):
     session_repository: SessionRepositoryInterface
     users_repository: UserRepositoryInterface
+    two_factor_repository: TwoFactorRepositoryInterface
 
     @abstractmethod
     def login(self, username: str, password: str, remember_me: bool, user_agent: str, ip: str) -> dict:
@@ -87,9 +88,11 @@ class AuthInterface(ABC):
 
 
 class AuthService(AuthInterface):
-    def __init__(self, users_repository: UserRepositoryInterface, session_repository: SessionRepositoryInterface):
+    def __init__(self, users_repository: UserRepositoryInterface, session_repository: SessionRepositoryInterface,
+                 two_factor_repository: TwoFactorRepositoryInterface):
         self.users_repository = users_repository
         self.session_repository = session_repository
+        self.two_factor_repository = two_factor_repository
 
     def authenticate(self, user: User, remember_me: bool, user_agent: str, ip: str) -> dict:
         self.users_repository.update_last_seen(user)
@@ -110,7 +113,7 @@ class AuthService(AuthInterface):
             payload = jwt.decode(token, app.config.get('SECRET_KEY'), algorithms=["HS256"])
             user = self.users_repository.get_by_id(payload["id"])
             if user and payload["type"] == TokenType.two_factor:
-                if secrets.compare_digest(bytes(code), bytes(user.two_factor_code)):
+                if self.two_factor_repository.check(user.id, code):
                     g.current_user = user
                     return self.authenticate(user, remember_me, user_agent, ip)
                 else:
@@ -123,6 +126,8 @@ class AuthService(AuthInterface):
     def login(self, username: str, password: str, remember_me: bool, user_agent: str, ip: str) -> dict:
         user: User = self.users_repository.get_by_username(username, False)
         if user and check_password(user, password):
+            if needs_rehash(user):
+                set_password(user, password)
             g.current_user = user
             if g.current_user.two_factor_enabled:
                 self.send_two_factor_code()
@@ -172,14 +177,7 @@ class AuthService(AuthInterface):
         user = self.users_repository.get_by_email(email)
         if user:
             token = generate_token(user.id, app.config.get("PASSWORD_TOKEN_LIFETIME"), type=TokenType.reset_password)
-            subject: str = "Сброс пароля"
-            send_email.delay(
-                subject,
-                app.config['ADMINS'][0],
-                [user.email],
-                render_template('email/reset_password.txt', user=user, token=token),
-                render_template('email/reset_password.html', user=user, token=token)
-            )
+            send_user_email.delay('reset_password', user.id, token=token)
         else:
             abort(404)
 
@@ -213,14 +211,8 @@ class AuthService(AuthInterface):
 
     def request_verify_email(self) -> None:
         token = generate_token(g.current_user.id, app.config.get("EMAIL_TOKEN_LIFETIME"), type=TokenType.verify_email)
-        subject: str = "Подтверждение электронной почты"
-        send_email.delay(
-            subject,
-            app.config['ADMINS'][0],
-            [g.current_user.email],
-            render_template('email/verify_email.txt', user=g.current_user, token=token),
-            render_template('email/verify_email.html', user=g.current_user, token=token)
-        )
+        # ссылка строится в запросе: в обработчике задач нет контекста запроса
+        send_user_email.delay('verify_email', g.current_user.id, url=url_for('email', token=token, _external=True))
 
     def verify_email(self, token: str) -> None:
         try:
@@ -248,14 +240,7 @@ class AuthService(AuthInterface):
     def send_two_factor_code(self) -> None:
         if g.current_user.verified_email:
             code = secrets.choice(range(app.config['TWO_FACTOR_MIN_CODE'], app.config['TWO_FACTOR_MAX_CODE']))
-            self.users_repository.update_model_from_dict(g.current_user, {"two_factor_code": code})
-            subject: str = "Код авторизации"
-            send_email.delay(
-                subject,
-                app.config['ADMINS'][0],
-                [g.current_user.email],
-                render_template('email/two_factor.txt', user=g.current_user, code=code),
-                render_template('email/two_factor.html', user=g.current_user, code=code)
-            )
+            self.two_factor_repository.add(g.current_user.id, code)
+            send_user_email.delay('two_factor', g.current_user.id, code=code)
         else:
             abort(400)
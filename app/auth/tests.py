@@ -1,23 +1,37 @@
 import os
-from unittest import TestCase, main
+from datetime import datetime, timezone, timedelta
+from types import SimpleNamespace
+from unittest import TestCase, main, skipIf
 
 import jwt
+import sqlalchemy as sa
+from celery.signals import celeryd_init
+from flask import g
+from werkzeug.exceptions import Unauthorized, NotFound
 
-from app import create_app, db
-from app.auth.repository import SessionRepository
-from app.auth.service import AuthService
+from app import create_app, create_worker_app, db, mail
+from app.auth import verify_token
+from app.auth.repository import SessionRepository, MemoryTwoFactorRepository, RedisSessionRepository
+from app.auth.service import AuthService, TokenType
 from app.auth.utils import generate_token
 from app.models import Session, User
+from app.tasks import send_user_email
 from app.users.repository import UserRepository
 from app.users.utils import set_password
 from config import TestConfig
 
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
 
 class AuthModelCase(TestCase):
     def setUp(self):
         self.app = create_app(TestConfig)
         self.app_context = self.app.app_context()
-        self.service = AuthService(UserRepository(), SessionRepository())
+        self.two_factor_repository = MemoryTwoFactorRepository()
+        self.service = AuthService(UserRepository(), SessionRepository(), self.two_factor_repository)
         self.app_context.push()
         db.create_all()
 
@@ -64,6 +78,36 @@ class AuthModelCase(TestCase):
             self.assertEqual(session.ip, '1.1.1.1')
             self.assertEqual(data['refresh_token'], str(session.id))
 
+    def test_login_rehash(self):
+        with self.app.app_context(), self.app.test_request_context():
+            self.app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:2000'
+            user: User = User(username="test", email="test@example.com", firstname="Иван", lastname="Петров")
+            set_password(user, "123123123")
+            db.session.add(user)
+            db.session.commit()
+            self.assertTrue(user.password_hash.startswith('pbkdf2:sha256:2000$'))
+            self.app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'
+            self.service.login("test", "123123123", False, 'test_platform', '1.1.1.2')
+            self.assertTrue(user.password_hash.startswith('pbkdf2:sha256:1000$'))
+            data: dict = self.service.login("test", "123123123", False, 'test_platform', '1.1.1.2')
+            self.assertEqual(data['message'], 'Вы успешно вошли')
+
+    def test_check_two_factor_code(self):
+        with self.app.app_context(), self.app.test_request_context():
+            user: User = User(username="test", email="test@example.com", firstname="Иван", lastname="Петров")
+            set_password(user, "123123123")
+            db.session.add(user)
+            db.session.commit()
+            token: str = generate_token(user.id, 10, type=TokenType.two_factor)
+            self.two_factor_repository.add(user.id, 123456)
+            data: dict = self.service.check_two_factor_code(123456, token, False, 'test_platform', '1.1.1.2')
+            self.assertEqual(data['user']['username'], 'test')
+            self.assertFalse(self.two_factor_repository.check(user.id, 123456))
+            self.two_factor_repository.add(user.id, 123456)
+            for _ in range(self.app.config['TWO_FACTOR_MAX_ATTEMPTS']):
+                self.assertFalse(self.two_factor_repository.check(user.id, 654321))
+            self.assertFalse(self.two_factor_repository.check(user.id, 123456))
+
     def test_refresh(self):
         with self.app.app_context(), self.app.test_request_context():
             user: User = User(username="test", email="test@example.com", firstname="Иван", lastname="Петров")
@@ -90,6 +134,144 @@ class AuthModelCase(TestCase):
             session: Session = db.session.scalar(user.sessions.select())
             self.assertEqual(session, None)
 
+    def test_verify_token_claims(self):
+        with self.app.app_context(), self.app.test_request_context():
+            self.app.config['AUTH_MODE'] = 'claims'
+            user: User = User(username="test", email="test@example.com", firstname="Иван", lastname="Петров")
+            set_password(user, "123123123")
+            db.session.add(user)
+            db.session.commit()
+            token: str = generate_token(user.id, 60)
+            db.session.remove()
+            statements = []
+            sa.event.listen(db.engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+            self.assertTrue(verify_token(token))
+            self.assertTrue(verify_token(token))
+            self.assertEqual(g.current_user.id, 1)
+            self.assertEqual(statements, [])
+            self.assertEqual(g.current_user.username, "test")
+            self.assertEqual(len(statements), 1)
+            self.assertFalse(verify_token(generate_token(user.id, -1)))
+            self.assertFalse(verify_token(token + "x"))
+
+    def test_delete_expired(self):
+        with self.app.app_context(), self.app.test_request_context():
+            user: User = User(username="test", email="test@example.com", firstname="Иван", lastname="Петров")
+            set_password(user, "123123123")
+            db.session.add(user)
+            db.session.commit()
+            expired = datetime.now(timezone.utc) - timedelta(days=1)
+            db.session.add_all([Session(user_id=user.id, ip='1.1.1.1', expires=expired) for _ in range(5)])
+            db.session.add(Session(user_id=user.id, ip='1.1.1.2'))
+            db.session.commit()
+            self.assertEqual(SessionRepository().delete_expired(2, 10), 5)
+            session: Session = db.session.scalar(user.sessions.select())
+            self.assertEqual(session.ip, '1.1.1.2')
+            self.assertEqual(SessionRepository().delete_expired(2, 10), 0)
+
+    def test_login_rate_limit(self):
+        with self.app.app_context():
+            user: User = User(username="test", email="test@example.com", firstname="Иван", lastname="Петров")
+            set_password(user, "123123123")
+            db.session.add(user)
+            db.session.commit()
+            client = self.app.test_client()
+            capacity, period = self.app.config['RATELIMITS']['login']
+            for _ in range(capacity):
+                response = client.post('/api/token', json={"username": "test", "password": "000000000"})
+                self.assertEqual(response.status_code, 403)
+            response = client.post('/api/token', json={"username": "test", "password": "123123123"})
+            self.assertEqual(response.status_code, 429)
+            self.assertGreater(int(response.headers['Retry-After']), 0)
+            response = client.post('/api/token', json={"username": "test", "password": "123123123"},
+                                   headers={"X-Real-IP": "1.1.1.1"})
+            self.assertEqual(response.status_code, 429)
+
+    @skipIf(fakeredis is None, "fakeredis не установлен")
+    def test_redis_session_repository(self):
+        redis = fakeredis.FakeRedis(decode_responses=True)
+        self.app.extensions['redis'] = redis
+        repository = RedisSessionRepository()
+        user: User = User(username="test", email="test@example.com", firstname="Иван", lastname="Петров")
+        db.session.add(user)
+        db.session.commit()
+        sessions = [repository.add(user.id, "Linux", f"127.0.0.{i}") for i in range(3)]
+        self.assertGreater(redis.ttl(repository.session_key(sessions[0].id)), 0)
+        with self.app.test_request_context():
+            page = repository.paginate(1, 2, user)
+        self.assertEqual(page['meta']['total_items'], 3)
+        self.assertEqual([item['ip'] for item in page['items']], ["127.0.0.2", "127.0.0.1"])
+        self.assertIsNotNone(page['links']['next'])
+
+        session = repository.get_by_id(sessions[0].id)
+        old_id = session.id
+        refresh_token = repository.refresh(session)
+        self.assertEqual(repository.get_by_id(refresh_token).ip, "127.0.0.0")
+        with self.assertRaises(NotFound):
+            repository.get_by_id(old_id)
+        # повторное обновление по старому сеансу после его замены или истечения
+        stale = repository.to_model(old_id, {'platform': '', 'ip': '127.0.0.0', 'user_id': user.id,
+                                             'created_at': sessions[0].created_at.isoformat(),
+                                             'expires': sessions[0].expires.isoformat()})
+        with self.assertRaises(Unauthorized):
+            repository.refresh(stale)
+        self.assertEqual(redis.zcard(repository.user_key(user.id)), 3)
+
+        repository.delete(repository.get_by_id(refresh_token))
+        self.assertEqual(redis.zcard(repository.user_key(user.id)), 2)
+        repository.delete_all(user)
+        self.assertEqual(redis.keys('*'), [])
+
+    def test_send_user_email(self):
+        user: User = User(username="test", email="test@example.com", firstname="Иван", lastname="Петров")
+        db.session.add(user)
+        db.session.commit()
+        with mail.record_messages() as outbox:
+            send_user_email('two_factor', user.id, code=123456)
+            send_user_email('reset_password', user.id, token='reset-token')
+            send_user_email('verify_email', user.id, url='http://localhost/api/email?token=verify-token')
+        self.assertEqual(len(outbox), 3)
+        self.assertEqual([msg.subject for msg in outbox],
+                         ["Код авторизации", "Сброс пароля", "Подтверждение электронной почты"])
+        self.assertEqual(outbox[0].recipients, ["test@example.com"])
+        self.assertIn("123456", outbox[0].body)
+        self.assertIn("test", outbox[0].html)
+        self.assertIn("set-new-password?token=reset-token", outbox[1].body)
+        self.assertIn("set-new-password?token=reset-token", outbox[1].html)
+        self.assertIn("/api/email?token=verify-token", outbox[2].body)
+        self.assertIn("/api/email?token=verify-token", outbox[2].html)
+
+    def test_task_queues(self):
+        router = self.app.extensions['celery'].amqp.router
+        self.assertEqual(router.route({}, 'app.tasks.send_user_email')['queue'].name, 'auth-critical')
+        self.assertEqual(router.route({}, 'app.tasks.send_email')['queue'].name, 'email-bulk')
+        self.assertEqual(router.route({}, 'app.tasks.collect_media_garbage')['queue'].name, 'maintenance')
+        self.assertEqual(router.route({}, 'app.tasks.process_image')['queue'].name, 'default')
+        conf = SimpleNamespace(worker_concurrency=None)
+        celeryd_init.send(sender='test', conf=conf, options={'queues': ['auth-critical', 'maintenance']})
+        self.assertEqual(conf.worker_concurrency, 5)
+
+    def test_worker_app(self):
+        worker_app = create_worker_app(TestConfig)
+        self.assertEqual([rule.endpoint for rule in worker_app.url_map.iter_rules()], ['static'])
+        self.assertNotIn('socketio', worker_app.extensions)
+        self.assertNotIn('migrate', worker_app.extensions)
+        celery = worker_app.extensions['celery']
+        celery.loader.import_default_modules()
+        self.assertIn('app.tasks.send_user_email', celery.tasks)
+        with worker_app.app_context():
+            db.create_all()
+            user: User = User(username="ivan", email="ivan@example.com", firstname="Иван", lastname="Петров")
+            db.session.add(user)
+            db.session.commit()
+            with mail.record_messages() as outbox:
+                celery.tasks['app.tasks.send_user_email']('verify_email', user.id,
+                                                                 url='http://localhost/api/email?token=token')
+            self.assertEqual(outbox[0].recipients, ["ivan@example.com"])
+            self.assertIn('http://localhost/api/email?token=token', outbox[0].body)
+            db.session.remove()
+            db.drop_all()
+
 
 if __name__ == '__main__':
     main(verbosity=2)
@@ -1,10 +1,26 @@
 import jwt
 from datetime import datetime, timezone, timedelta
+from functools import lru_cache
 from flask import current_app as app
 
+TOKEN_CACHE_SIZE = 1024
+
 
 def generate_token(user_id: int, expires: int, **kwargs) -> str:
     return jwt.encode(
         {"id": user_id, **kwargs, "exp": datetime.now(timezone.utc) + timedelta(minutes=expires)},
         app.config["SECRET_KEY"], algorithm="HS256"
     )
+
+
+@lru_cache(maxsize=TOKEN_CACHE_SIZE)
+def _decode_token(token: str, secret_key: str) -> dict:
+    return jwt.decode(token, secret_key, algorithms=["HS256"], options={"require": ["exp"], "verify_exp": False})
+
+
+def decode_token(token: str) -> dict:
+    """Проверка токена с кэшированием результата проверки подписи"""
+    payload = _decode_token(token, app.config["SECRET_KEY"])
+    if payload["exp"] <= datetime.now(timezone.utc).timestamp():
+        raise jwt.ExpiredSignatureError("Signature has expired")
+    return dict(payload)
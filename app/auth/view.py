@@ -7,6 +7,7 @@ from marshmallow import ValidationError
 from app.auth import token_auth
 from app.auth.schema import LoginSchema, CodeSchema
 from app.auth.service import AuthInterface
+from app.ratelimit import rate_limit
 from app.users.schema import UserUpdateSchema
 
 
@@ -19,11 +20,13 @@ class TwoFactorAPI(MethodView):
     def __init__(self, service: AuthInterface):
         self.service = service
 
+    @rate_limit('two_factor')
     def post(self):
         """Включение двухфакторной аутентификации"""
         self.service.enable_two_factor()
         return {"message": "Вы успешно включили двухфакторную аутентификацию"}
 
+    @rate_limit('two_factor')
     def delete(self):
         """Выключение двухфакторной аутентификации"""
         self.service.disable_two_factor()
@@ -74,6 +77,7 @@ class EmailAPI(MethodView):
     def __init__(self, service: AuthInterface):
         self.service = service
 
+    @rate_limit('email')
     def get(self):
         """Подтверждение электронной почты"""
         token = request.args.get('token')
@@ -83,6 +87,7 @@ class EmailAPI(MethodView):
         return redirect(f"{app.config["APP_URL"]}/security")
 
     @token_auth.login_required
+    @rate_limit('email')
     def post(self):
         """Запрос подтверждения электронной почты"""
         self.service.request_verify_email()
@@ -97,6 +102,7 @@ class PasswordAPI(MethodView):
     def __init__(self, service: AuthInterface):
         self.service = service
 
+    @rate_limit('password')
     def post(self):
         """Запрос на сброс пароля"""
         if not request.json:
@@ -112,6 +118,7 @@ class PasswordAPI(MethodView):
         except ValidationError as err:
             abort(422, err.messages)
 
+    @rate_limit('password')
     def put(self):
         token = request.headers.get('Token')
         if not request.json or not token:
@@ -136,6 +143,7 @@ class TokenAPI(MethodView):
     def __init__(self, service: AuthInterface):
         self.service = service
 
+    @rate_limit('refresh')
     def get(self):
         """Обновление access токена"""
         refresh_token: str | None = request.cookies.get('refresh_token')
@@ -149,6 +157,7 @@ class TokenAPI(MethodView):
                                 max_age=timedelta(days=app.config.get('SESSION_LIFETIME')), httponly=True)
         return response
 
+    @rate_limit('login')
     def post(self):
         """Аутентификация в приложении"""
         if not request.json:
@@ -4,7 +4,9 @@ import sqlalchemy as sa
 from flask import url_for
 
 from app import db
-from app.models import Community, User
+from app.images import get_image_links
+from app.models import Community, Post, User
+from app.sync.repository import ChangeRepository
 from app.utils import paginate
 from flask import g
 
@@ -44,6 +46,10 @@ class CommunityRepositoryInterface(ABC):
     def update_image_url(self, community: Community, image_url: str) -> None:
         pass
 
+    @abstractmethod
+    def update_image_renditions(self, community: Community, renditions: dict) -> None:
+        pass
+
     @abstractmethod
     def is_member(self, community: Community, user: User) -> bool:
         pass
@@ -81,11 +87,20 @@ class CommunityRepository(CommunityRepositoryInterface):
         return paginate(query, Community, self, filters, page, per_page, 'communities', Community.register_date)
 
     def delete(self, community: Community) -> None:
+        # публикации сообщества удаляются каскадно в базе данных, клиенты узнают о них из журнала изменений
+        posts = db.session.execute(sa.select(Post.id, Post.user_id).where(Post.community_id == community.id)).all()
         db.session.delete(community)
+        ChangeRepository().add_many([{'user_id': user_id, 'entity': 'post', 'entity_id': post_id, 'action': 'deleted'}
+                                     for post_id, user_id in posts if user_id is not None])
         db.session.commit()
 
     def update_image_url(self, community: Community, image_url: str) -> None:
         community.image_url = image_url
+        community.image_renditions = None
+        db.session.commit()
+
+    def update_image_renditions(self, community: Community, renditions: dict) -> None:
+        community.image_renditions = renditions
         db.session.commit()
 
     def update_model_from_dict(self, model: Community, data: dict):
@@ -95,6 +110,7 @@ class CommunityRepository(CommunityRepositoryInterface):
         db.session.commit()
 
     def model_to_dict(self, model: Community) -> dict:
+        image, srcset = get_image_links(model.image_url, model.image_renditions)
         data = {
             'id': model.id,
             'name': model.name,
@@ -105,7 +121,8 @@ class CommunityRepository(CommunityRepositoryInterface):
             'members_count': self.get_members_count(model),
             'links': {
                 'self': url_for('community', community_id=model.id),
-                'image': model.image_url
+                'image': image,
+                'srcset': srcset
             }
         }
         return data
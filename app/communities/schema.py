@@ -13,3 +13,4 @@ class CommunitySchema(Schema):
                       error_messages={"required": "Введите описание сообщества",
                                       "null": "Введите описание сообщества", "invalid": "Проверьте описание сообщества"})
     user_id = fields.Integer(error_messages={"invalid": "Проверьте владельца"})
+    upload_id = fields.UUID(error_messages={"invalid": "Проверьте загруженный файл"})
@@ -1,16 +1,17 @@
 import math
 from abc import ABC, abstractmethod
-from hashlib import md5
 
 import sqlalchemy as sa
-from flask import g, abort, current_app as app
-from werkzeug.utils import secure_filename
-import os
+from flask import g, abort
+from werkzeug.datastructures import FileStorage
 from app.communities.repository import CommunityRepositoryInterface
 from app.models import Post, Community, User
 from app.posts.repository import PostRepositoryInterface
 from app.users.repository import UserRepositoryInterface
 from app import db
+from app.storage import save_upload
+from app.tasks import process_image
+from app.uploads.repository import UploadRepositoryInterface
 from app.utils import get_similarity_vector
 
 SUBSCRIPTION_WEIGHT = 5
@@ -22,6 +23,7 @@ class CommunityServiceInterface(ABC):
     community_repository: CommunityRepositoryInterface
     post_repository: PostRepositoryInterface
     user_repository: UserRepositoryInterface
+    upload_repository: UploadRepositoryInterface
 
     @abstractmethod
     def get_communities(self, user_id: int | None, community_type: str, filters: dict, page: int,
@@ -45,7 +47,7 @@ class CommunityServiceInterface(ABC):
         pass
 
     @abstractmethod
-    def upload_image(self, post: Post, image) -> None:
+    def upload_image(self, post: Post, image: FileStorage | str) -> None:
         pass
 
     @abstractmethod
@@ -66,22 +68,17 @@ class CommunityServiceInterface(ABC):
 
 
 class CommunityService(CommunityServiceInterface):
-    def __init__(self, community_repository: CommunityRepositoryInterface, user_repository: UserRepositoryInterface):
+    def __init__(self, community_repository: CommunityRepositoryInterface, user_repository: UserRepositoryInterface,
+                 upload_repository: UploadRepositoryInterface):
         self.community_repository = community_repository
         self.user_repository = user_repository
+        self.upload_repository = upload_repository
 
-    def upload_image(self, community: Community, image) -> None:
-        filename = secure_filename(image.filename)
-        extension = filename.rsplit('.', 1)[1].lower()
-        filename = f'{md5(community.owner.username.encode('utf-8')).hexdigest()}.{extension}'
-        image_path = os.path.join(app.config['UPLOAD_FOLDER'], 'communities', filename)
-        if not os.path.exists(app.config['UPLOAD_FOLDER']):
-            os.mkdir(app.config['UPLOAD_FOLDER'])
-        if not os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], 'communities')):
-            os.mkdir(os.path.join(app.config['UPLOAD_FOLDER'], 'communities'))
-        image.save(image_path)
-        image_url: str = f'/static/images/communities/{filename}'
+    def upload_image(self, community: Community, image: FileStorage | str) -> None:
+        """Установка изображения из файла запроса или по ссылке на завершенную загрузку"""
+        image_url: str = save_upload(image) if isinstance(image, FileStorage) else image
         self.community_repository.update_image_url(community, image_url)
+        process_image.delay('community', community.id, image_url)
 
     def add_community(self, data: dict) -> dict:
         owner_id = data.get('user_id')
@@ -90,6 +87,9 @@ class CommunityService(CommunityServiceInterface):
         image = data.get("image")
         if image:
             del data["image"]
+        upload_id = data.pop("upload_id", None)
+        if upload_id:
+            image = self.upload_repository.get_url(upload_id, g.current_user)
         for key, value in data.items():
             if type(value) is str:
                 data[key] = value.strip()
@@ -106,6 +106,9 @@ class CommunityService(CommunityServiceInterface):
         image = data.get("image")
         if image:
             del data["image"]
+        upload_id = data.pop("upload_id", None)
+        if upload_id:
+            image = self.upload_repository.get_url(upload_id, g.current_user)
         for key, value in data.items():
             if type(value) is str:
                 data[key] = value.strip()
@@ -6,6 +6,7 @@ from app import create_app, db
 from app.communities.repository import CommunityRepository
 from app.communities.service import CommunityService
 from app.models import User, Community
+from app.uploads.repository import UploadRepository
 from app.users.repository import UserRepository
 from config import TestConfig
 
@@ -14,7 +15,7 @@ class CommunityModelCase(TestCase):
     def setUp(self):
         self.app = create_app(TestConfig)
         self.app_context = self.app.app_context()
-        self.service = CommunityService(CommunityRepository(), UserRepository())
+        self.service = CommunityService(CommunityRepository(), UserRepository(), UploadRepository())
         self.app_context.push()
         db.create_all()
 
@@ -1,4 +1,5 @@
 from flask import Blueprint, jsonify
+from sqlalchemy.orm.exc import ObjectDeletedError
 from werkzeug.exceptions import HTTPException
 
 from app import db
@@ -43,6 +44,11 @@ def method_not_allowed_error(error):
     return error_response(405, 'Метод запроса не поддерживается')
 
 
+@bp.app_errorhandler(409)
+def conflict_error(error):
+    return error_response(409, error.description)
+
+
 @bp.app_errorhandler(415)
 def unsupported_media_type_error(error):
     return error_response(415, 'Запрос не поддерживается')
@@ -58,6 +64,20 @@ def not_found_error(error):
     return error_response(404, 'Страница не найдена')
 
 
+@bp.app_errorhandler(429)
+def too_many_requests_error(error):
+    response, status_code = error_response(429, 'Слишком много запросов, попробуйте позже')
+    if error.retry_after:
+        response.headers['Retry-After'] = str(error.retry_after)
+    return response, status_code
+
+
+@bp.app_errorhandler(ObjectDeletedError)
+def deleted_user_error(error):
+    db.session.rollback()
+    return error_response(401, 'У Вас нет прав для доступа к этому ресурсу')
+
+
 @bp.app_errorhandler(500)
 def internal_error(error):
     db.session.rollback()
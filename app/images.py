@@ -0,0 +1,89 @@
+import io
+from typing import BinaryIO
+
+from PIL import Image, ImageOps
+
+from app.storage import get_storage
+
+# имя копии и наибольшая сторона в пикселях
+RENDITIONS = {'thumb': 160, 'medium': 640, 'full': 1600}
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg'}
+MIME_TYPES = {'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+# сигнатуры в начале файла и расширение для сохранения
+SIGNATURES = {b'\x89PNG\r\n\x1a\n': 'png', b'\xff\xd8\xff': 'jpg', b'GIF87a': 'gif', b'GIF89a': 'gif'}
+
+
+def detect_image_type(head: bytes) -> str | None:
+    """Расширение по сигнатуре в начале файла или None, если формат не поддерживается"""
+    return next((extension for signature, extension in SIGNATURES.items() if head.startswith(signature)), None)
+
+
+def open_image(source: BinaryIO) -> tuple[Image.Image, bool]:
+    """Открытие изображения с учетом ориентации из EXIF, возвращает RGB(A)-копию и признак прозрачности"""
+    with Image.open(source) as original:
+        original = ImageOps.exif_transpose(original)
+        has_alpha = original.mode in ('RGBA', 'LA', 'PA') or 'transparency' in original.info
+        return original.convert('RGBA' if has_alpha else 'RGB'), has_alpha
+
+
+def encode_image(image: Image.Image, image_format: str, has_alpha: bool) -> io.BytesIO:
+    """Кодирование изображения в формат из FORMATS, прозрачность для JPEG заменяется белым фоном"""
+    pil_format, options = FORMATS[image_format]
+    if pil_format == 'JPEG' and has_alpha:
+        output = Image.new('RGB', image.size, 'white')
+        output.paste(image, mask=image.getchannel('A'))
+        image = output
+    # метаданные (EXIF, ICC, XMP) не передаются при сохранении, поэтому в копии не попадают
+    buffer = io.BytesIO()
+    image.save(buffer, pil_format, **options)
+    buffer.seek(0)
+    return buffer
+
+
+def make_renditions(url: str) -> dict | None:
+    """Создание уменьшенных копий загруженного изображения в форматах WebP и JPEG без метаданных"""
+    storage = get_storage()
+    key = storage.key(url)
+    if key is None:
+        return None
+    stem = key.rsplit('.', 1)[0]
+    renditions = {}
+    with storage.open(key) as source:
+        original, has_alpha = open_image(source)
+    with original:
+        for name, size in RENDITIONS.items():
+            image = original.copy()
+            image.thumbnail((size, size), Image.Resampling.LANCZOS)
+            rendition = {'width': image.width, 'height': image.height}
+            for key in FORMATS:
+                rendition_key = f'{stem}_{name}.{EXTENSIONS[key]}'
+                rendition[key] = storage.url(rendition_key)
+                # имя исходного файла - хеш содержимого, поэтому готовые копии не пересоздаются,
+                # а только обновляется время изменения, чтобы их не удалила очистка хранилища
+                if storage.exists(rendition_key):
+                    storage.touch(rendition_key)
+                    continue
+                storage.write(rendition_key, encode_image(image, key, has_alpha))
+            renditions[name] = rendition
+    return renditions
+
+
+def resize_image(source: BinaryIO, width: int | None, height: int | None, image_format: str) -> io.BytesIO:
+    """Уменьшение изображения до размещения в рамке width x height без увеличения и искажения пропорций"""
+    image, has_alpha = open_image(source)
+    with image:
+        image.thumbnail((width or image.width, height or image.height), Image.Resampling.LANCZOS)
+        return encode_image(image, image_format, has_alpha)
+
+
+def get_image_links(url: str | None, renditions: dict | None) -> tuple[str | None, dict | None]:
+    """Ссылка на изображение и наборы srcset по форматам, пока копии не готовы - исходный файл"""
+    if not renditions:
+        return url, None
+    srcset = {key: ', '.join(f"{rendition[key]} {rendition['width']}w" for rendition in renditions.values())
+              for key in FORMATS}
+    return renditions['full']['jpeg'], srcset
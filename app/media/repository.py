@@ -0,0 +1,131 @@
+import os
+import shutil
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import BinaryIO, Iterator
+
+import sqlalchemy as sa
+
+from app import db
+from app.images import FORMATS
+from app.models import User, Post, Community
+from app.users.utils import run_blocking
+
+
+class RenditionCacheInterface(ABC):
+    @abstractmethod
+    def get(self, name: str) -> str | None:
+        """Путь к готовой копии или None"""
+        pass
+
+    @abstractmethod
+    def put(self, name: str, stream: BinaryIO) -> str:
+        pass
+
+    @abstractmethod
+    def lock(self, name: str):
+        """Блокировка на время создания копии, чтобы одинаковые запросы не обрабатывали изображение повторно"""
+        pass
+
+
+class DiskRenditionCache(RenditionCacheInterface):
+    """Копии в локальном каталоге, при превышении max_size удаляются давно запрошенные"""
+
+    def __init__(self, folder: str, max_size: int):
+        self.folder = folder
+        self.max_size = max_size
+        self.size: int | None = None
+        self.guard = threading.Lock()
+        self.locks: dict[str, tuple[threading.Lock, int]] = {}
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.folder, name[:2], name)
+
+    def get(self, name: str) -> str | None:
+        path = self.path(name)
+        try:
+            # время изменения файла - время последнего обращения, по нему выбираются копии для удаления
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, name: str, stream: BinaryIO) -> str:
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), suffix='.part', delete=False) as temp:
+            shutil.copyfileobj(stream, temp)
+            size = temp.tell()
+        os.replace(temp.name, path)
+        with self.guard:
+            # обход каталога занимает заметное время, поэтому выполняется в потоке ОС
+            if self.size is None:
+                self.size = run_blocking(self.total_size)
+            else:
+                self.size += size
+            if self.size > self.max_size:
+                run_blocking(self.evict)
+        return path
+
+    def total_size(self) -> int:
+        return sum(size for _, size, _ in self.scan())
+
+    def scan(self) -> Iterator[tuple[str, int, float]]:
+        for root, _, files in os.walk(self.folder):
+            for file in files:
+                path = os.path.join(root, file)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def evict(self) -> None:
+        # размер пересчитывается по каталогу, так как его заполняют все процессы сервера
+        files = sorted(self.scan(), key=lambda file: file[2])
+        self.size = sum(size for _, size, _ in files)
+        target = self.max_size * 0.9
+        for path, size, _ in files:
+            if self.size <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.size -= size
+
+    @contextmanager
+    def lock(self, name: str):
+        with self.guard:
+            lock, waiting = self.locks.get(name, (threading.Lock(), 0))
+            self.locks[name] = (lock, waiting + 1)
+        try:
+            with lock:
+                yield
+        finally:
+            with self.guard:
+                lock, waiting = self.locks.pop(name)
+                if waiting > 1:
+                    self.locks[name] = (lock, waiting - 1)
+
+
+class MediaRepositoryInterface(ABC):
+    @abstractmethod
+    def get_referenced_urls(self, batch_size: int) -> Iterator[str]:
+        """Ссылки на все используемые изображения и их копии"""
+        pass
+
+
+class MediaRepository(MediaRepositoryInterface):
+    def get_referenced_urls(self, batch_size: int) -> Iterator[str]:
+        for url_column, renditions_column in ((User.avatar_url, User.avatar_renditions),
+                                              (Post.image_url, Post.image_renditions),
+                                              (Community.image_url, Community.image_renditions)):
+            query = sa.select(url_column, renditions_column).where(url_column.is_not(None))
+            # строки читаются порциями, таблицы целиком в память не загружаются
+            for url, renditions in db.session.execute(query.execution_options(yield_per=batch_size)):
+                yield url
+                for rendition in (renditions or {}).values():
+                    yield from (rendition[image_format] for image_format in FORMATS if image_format in rendition)
@@ -0,0 +1,15 @@
+from marshmallow import Schema, fields, validate
+
+
+class PresignSchema(Schema):
+    sha256 = fields.Str(required=True, validate=[validate.Regexp(
+        r'^[0-9a-f]{64}$', error="Хеш должен содержать 64 шестнадцатеричных символа")],
+                        error_messages={"required": "Укажите хеш файла", "null": "Укажите хеш файла",
+                                        "invalid": "Проверьте хеш файла"})
+    extension = fields.Str(required=True, error_messages={"required": "Укажите расширение файла",
+                                                          "null": "Укажите расширение файла",
+                                                          "invalid": "Проверьте расширение файла"})
+    length = fields.Integer(required=True, strict=True, validate=[validate.Range(
+        min=1, error="Размер файла должен быть положительным")],
+                            error_messages={"required": "Укажите размер файла", "null": "Укажите размер файла",
+                                            "invalid": "Проверьте размер файла"})
@@ -0,0 +1,85 @@
+import hashlib
+import io
+import re
+from abc import ABC, abstractmethod
+
+from flask import abort, g, current_app as app
+
+from app.images import EXTENSIONS, FORMATS, MIME_TYPES, resize_image
+from app.media.repository import RenditionCacheInterface
+from app.models import Upload
+from app.storage import content_type, get_storage, make_key
+from app.uploads.repository import UploadRepositoryInterface
+from app.users.utils import run_blocking
+
+KEY_PATTERN = re.compile(r'^[0-9a-f]{2}/[0-9a-f]{64}\.[a-z]+$')
+
+
+class MediaServiceInterface(ABC):
+    rendition_cache: RenditionCacheInterface
+    upload_repository: UploadRepositoryInterface
+
+    @abstractmethod
+    def get_image(self, key: str, width: int | None, height: int | None, image_format: str) -> tuple[str, str, str]:
+        pass
+
+    @abstractmethod
+    def presign_upload(self, digest: str, extension: str, length: int) -> dict:
+        pass
+
+
+class MediaService(MediaServiceInterface):
+    def __init__(self, rendition_cache: RenditionCacheInterface, upload_repository: UploadRepositoryInterface):
+        self.rendition_cache = rendition_cache
+        self.upload_repository = upload_repository
+
+    def get_image(self, key: str, width: int | None, height: int | None, image_format: str) -> tuple[str, str, str]:
+        """Путь к копии изображения нужного размера и формата, ETag и тип содержимого"""
+        # размеры ограничены списком, иначе можно создать неограниченное число копий и переполнить кеш
+        sizes = app.config['IMAGE_SIZES']
+        if not KEY_PATTERN.match(key) or image_format not in FORMATS or any(
+                size is not None and size not in sizes for size in (width, height)):
+            abort(400)
+        # исходный файл неизменен (имя - хеш содержимого), поэтому копия однозначно задается параметрами
+        etag = hashlib.sha256(f'{key}:{width}:{height}:{image_format}'.encode()).hexdigest()
+        name = f'{etag}.{EXTENSIONS[image_format]}'
+        path = self.rendition_cache.get(name)
+        if path is None:
+            with self.rendition_cache.lock(name):
+                # пока ожидалась блокировка, копию мог создать другой запрос
+                path = self.rendition_cache.get(name)
+                if path is None:
+                    storage = get_storage()
+                    if not storage.exists(key):
+                        abort(404)
+                    # файл читается в текущем потоке: сокет S3 принадлежит циклу событий eventlet,
+                    # а в потоке ОС выполняется только обработка изображения Pillow
+                    limit = max(app.config['MAX_CONTENT_LENGTH'], app.config['UPLOAD_MAX_LENGTH'])
+                    with storage.open(key) as source:
+                        data = source.read(limit + 1)
+                    if len(data) > limit:
+                        abort(413)
+                    path = self.rendition_cache.put(
+                        name, run_blocking(resize_image, io.BytesIO(data), width, height, image_format))
+        return path, etag, MIME_TYPES[image_format]
+
+    def presign_upload(self, digest: str, extension: str, length: int) -> dict:
+        """Подписанная ссылка для загрузки файла клиентом напрямую в хранилище"""
+        extension = extension.lower().lstrip('.')
+        if extension not in app.config['ALLOWED_EXTENSIONS']:
+            abort(422, 'Недопустимый тип файла')
+        if length > app.config['MAX_CONTENT_LENGTH']:
+            abort(413)
+        storage = get_storage()
+        key = make_key(digest, extension)
+        # файл с таким содержимым уже загружен, повторная загрузка не нужна
+        if storage.exists(key):
+            storage.touch(key)
+            presigned = None
+        else:
+            presigned = storage.presign_upload(digest, extension, content_type(key), length)
+            if presigned is None:
+                abort(501)
+        # ссылку на файл можно использовать только через upload_id после проверки при завершении загрузки
+        upload: Upload = self.upload_repository.add(g.current_user, length, key)
+        return {'key': key, 'url': storage.url(key), 'upload': presigned, 'upload_id': str(upload.id)}
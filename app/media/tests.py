@@ -0,0 +1,213 @@
+import base64
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+import uuid
+from unittest import TestCase, main, skipIf
+
+import requests
+from PIL import Image
+from flask import g
+from werkzeug.exceptions import (NotImplemented, BadRequest, NotFound, Conflict, RequestEntityTooLarge,
+                                 UnprocessableEntity)
+
+from app import create_app, db
+from app.images import FORMATS, make_renditions
+from app.media.repository import DiskRenditionCache
+from app.media.service import MediaService
+from app.media.view import ImageAPI
+from app.models import User, Post
+from app.storage import S3Storage, get_storage
+from app.tasks import collect_media_garbage
+from app.uploads.repository import UploadRepository
+from app.uploads.service import UploadService
+from config import TestConfig
+
+JPEG = b"\xff\xd8\xff\xe0" + b"0" * 100
+
+try:
+    from moto.server import ThreadedMotoServer
+except ImportError:
+    ThreadedMotoServer = None
+
+
+class MediaModelCase(TestCase):
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        self.app_context = self.app.app_context()
+        self.cache_folder = tempfile.TemporaryDirectory()
+        self.service = MediaService(DiskRenditionCache(self.cache_folder.name, 1024 * 1024), UploadRepository())
+        self.upload_service = UploadService(UploadRepository())
+        self.app_context.push()
+        db.create_all()
+        self.user: User = User(username="petr", email="petr@example.com", firstname="Петр", lastname="Иванов")
+        db.session.add(self.user)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        self.cache_folder.cleanup()
+
+    def test_presign_filesystem(self):
+        with self.app.test_request_context(), tempfile.TemporaryDirectory() as folder:
+            self.app.config['UPLOAD_FOLDER'] = folder
+            g.current_user = self.user
+            storage = get_storage()
+            key = storage.save(io.BytesIO(JPEG), "jpg")
+            digest = hashlib.sha256(JPEG).hexdigest()
+            result: dict = self.service.presign_upload(digest, "JPG", len(JPEG))
+            self.assertEqual(result["url"], f"/static/images/{key}")
+            self.assertIsNone(result["upload"])
+            with self.assertRaises(Conflict):
+                UploadRepository().get_url(uuid.UUID(result["upload_id"]), self.user)
+            self.assertEqual(self.upload_service.finish_upload(uuid.UUID(result["upload_id"]))["url"], result["url"])
+            self.assertEqual(UploadRepository().get_url(uuid.UUID(result["upload_id"]), self.user), result["url"])
+            with self.assertRaises(RequestEntityTooLarge):
+                self.service.presign_upload(digest, "jpg", self.app.config['MAX_CONTENT_LENGTH'] + 1)
+            with self.assertRaises(NotImplemented):
+                self.service.presign_upload(hashlib.sha256(b"other").hexdigest(), "jpg", 5)
+
+    def test_get_image(self):
+        with tempfile.TemporaryDirectory() as folder:
+            self.app.config['UPLOAD_FOLDER'] = folder
+            source = io.BytesIO()
+            Image.new("RGB", (1200, 800), "red").save(source, "PNG")
+            source.seek(0)
+            key = get_storage().save(source, "png")
+            calls = []
+            put = self.service.rendition_cache.put
+            self.service.rendition_cache.put = lambda name, stream: calls.append(name) or put(name, stream)
+
+            def get_image():
+                with self.app.app_context():
+                    self.service.get_image(key, 640, None, "webp")
+
+            threads = [threading.Thread(target=get_image) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(len(calls), 1)
+            with self.app.test_request_context(f"/api/img/{key}?w=640&fmt=jpeg"):
+                response = ImageAPI(self.service).get(key)
+                response.direct_passthrough = False
+                self.assertEqual(response.mimetype, "image/jpeg")
+                self.assertIn("immutable", response.headers["Cache-Control"])
+                self.assertFalse(response.headers["ETag"].startswith("W/"))
+                with Image.open(io.BytesIO(response.get_data())) as image:
+                    self.assertEqual(image.size, (640, 427))
+            with self.app.test_request_context(f"/api/img/{key}?w=640&fmt=jpeg",
+                                               headers={"If-None-Match": response.headers["ETag"]}):
+                self.assertEqual(ImageAPI(self.service).get(key).status_code, 304)
+            with self.assertRaises(BadRequest):
+                self.service.get_image(key, 300, None, "webp")
+            with self.assertRaises(NotFound):
+                self.service.get_image(f"00/{'0' * 64}.png", 640, None, "webp")
+            # исходный файл читается в память целиком, поэтому его размер ограничен
+            self.app.config['MAX_CONTENT_LENGTH'] = self.app.config['UPLOAD_MAX_LENGTH'] = 100
+            with self.assertRaises(RequestEntityTooLarge):
+                self.service.get_image(key, 160, None, "webp")
+
+    def test_rendition_cache_eviction(self):
+        cache = DiskRenditionCache(self.cache_folder.name, 1000)
+        for index, name in enumerate(("aa1", "bb2", "cc3")):
+            cache.put(name, io.BytesIO(b"0" * 400))
+            os.utime(cache.path(name), (index, index))
+        self.assertIsNone(cache.get("aa1"))
+        self.assertIsNotNone(cache.get("bb2"))
+        self.assertIsNotNone(cache.get("cc3"))
+
+    def test_collect_media_garbage(self):
+        with tempfile.TemporaryDirectory() as folder:
+            self.app.config['UPLOAD_FOLDER'] = folder
+            storage = get_storage()
+            avatar, image, thumb, orphan, recent = (storage.save(io.BytesIO(data), "jpg") for data in (
+                b"avatar", b"image", b"thumb", b"orphan", b"recent"))
+            for key in (avatar, image, thumb, orphan):
+                os.utime(storage.path(key), (0, 0))
+            user: User = User(username="ivan", email="ivan@example.com", firstname="Иван", lastname="Петров",
+                              avatar_url=storage.url(avatar))
+            post: Post = Post(hashtags="новости", text="тестирование публикации", image_url=storage.url(image),
+                              image_renditions={"thumb": {"width": 160, "height": 80, "webp": storage.url(thumb),
+                                                          "jpeg": storage.url(thumb)}})
+            post.author = user
+            db.session.add_all([user, post])
+            db.session.commit()
+            self.assertEqual(collect_media_garbage(dry_run=True), {"files": 1, "bytes": 6, "dry_run": True})
+            self.assertTrue(storage.exists(orphan))
+            self.assertEqual(collect_media_garbage(), {"files": 1, "bytes": 6, "dry_run": False})
+            self.assertEqual(sorted(key for key, _, _ in storage.list()), sorted([avatar, image, thumb, recent]))
+
+    def test_collect_reused_renditions(self):
+        with tempfile.TemporaryDirectory() as folder:
+            self.app.config['UPLOAD_FOLDER'] = folder
+            storage = get_storage()
+            source = io.BytesIO()
+            Image.new("RGB", (400, 300), "red").save(source, "PNG")
+            key = storage.save(io.BytesIO(source.getvalue()), "png")
+            renditions = make_renditions(storage.url(key))
+            for file_key, _, _ in storage.list():
+                os.utime(storage.path(file_key), (0, 0))
+            # файл загружен повторно, очистка запускается до сохранения ссылок на него и его копии
+            storage.save(io.BytesIO(source.getvalue()), "png")
+            self.assertEqual(make_renditions(storage.url(key)), renditions)
+            self.assertEqual(collect_media_garbage(), {"files": 0, "bytes": 0, "dry_run": False})
+            for rendition in renditions.values():
+                for image_format in FORMATS:
+                    self.assertTrue(storage.exists(storage.key(rendition[image_format])))
+
+    @skipIf(ThreadedMotoServer is None, "moto не установлен")
+    def test_s3_storage(self):
+        server = ThreadedMotoServer(port=0, verbose=False)
+        server.start()
+        self.addCleanup(server.stop)
+        host, port = server.get_host_and_port()
+        endpoint = f"http://{host}:{port}"
+        storage = S3Storage("media", f"{endpoint}/media", 60, endpoint_url=endpoint, region_name="us-east-1",
+                            aws_access_key_id="test", aws_secret_access_key="test")
+        storage.client.create_bucket(Bucket="media")
+        self.app.extensions['storage'] = storage
+        key = storage.save(io.BytesIO(b"image" * 1000), "png")
+        self.assertEqual(storage.save(io.BytesIO(b"image" * 1000), "png"), key)
+        self.assertEqual([item[0] for item in storage.list()], [key])
+        self.assertEqual(storage.client.head_object(Bucket="media", Key=key)["ContentType"], "image/png")
+        storage.write("renditions/thumb.webp", io.BytesIO(b"thumb"))
+        self.assertEqual(storage.client.head_object(Bucket="media", Key="renditions/thumb.webp")["ContentType"],
+                         "image/webp")
+        storage.delete("renditions/thumb.webp")
+        self.assertEqual(storage.key(storage.url(key)), key)
+        with storage.open(key) as body:
+            self.assertEqual(body.read(), b"image" * 1000)
+        with self.app.test_request_context():
+            g.current_user = self.user
+            digest = hashlib.sha256(JPEG).hexdigest()
+            result: dict = self.service.presign_upload(digest, "jpg", len(JPEG))
+            self.assertEqual(result["upload"]["method"], "POST")
+            policy = json.loads(base64.b64decode(result["upload"]["fields"]["policy"]))
+            self.assertIn(["content-length-range", len(JPEG), len(JPEG)], policy["conditions"])
+            self.assertIn({"Content-Type": "image/jpeg"}, policy["conditions"])
+            response = requests.post(result["upload"]["url"], data=result["upload"]["fields"],
+                                     files={"file": JPEG})
+            self.assertLess(response.status_code, 300)
+            self.assertEqual(self.upload_service.finish_upload(uuid.UUID(result["upload_id"]))["url"],
+                             storage.url(result["key"]))
+            self.assertIsNone(self.service.presign_upload(digest, "jpg", len(JPEG))["upload"])
+            self.assertEqual(storage.client.head_object(Bucket="media", Key=result["key"])["ContentType"],
+                             "image/jpeg")
+            # политика запроса не проверяет хеш, поэтому подмененное содержимое отклоняется при завершении
+            forged = self.service.presign_upload(hashlib.sha256(b"forged").hexdigest(), "jpg", len(JPEG))
+            requests.post(forged["upload"]["url"], data=forged["upload"]["fields"], files={"file": JPEG[::-1]})
+            with self.assertRaises(UnprocessableEntity):
+                self.upload_service.finish_upload(uuid.UUID(forged["upload_id"]))
+            self.assertFalse(storage.exists(forged["key"]))
+        storage.delete(key)
+        self.assertFalse(storage.exists(key))
+
+
+if __name__ == '__main__':
+    main(verbosity=2)
@@ -0,0 +1,44 @@
+from flask import request, abort, send_file
+from flask.views import MethodView
+from marshmallow import ValidationError
+
+from app.auth import token_auth
+from app.media.schema import PresignSchema
+from app.media.service import MediaServiceInterface
+
+
+class PresignAPI(MethodView):
+    init_every_request = False
+    decorators = [token_auth.login_required]
+
+    service: MediaServiceInterface
+
+    def __init__(self, service: MediaServiceInterface):
+        self.service = service
+
+    def post(self):
+        """Получение ссылки для прямой загрузки файла в хранилище"""
+        try:
+            data = PresignSchema().load(request.get_json(silent=True) or {})
+        except ValidationError as err:
+            abort(422, err.messages)
+        return self.service.presign_upload(data['sha256'], data['extension'], data['length'])
+
+
+class ImageAPI(MethodView):
+    init_every_request = False
+
+    service: MediaServiceInterface
+
+    def __init__(self, service: MediaServiceInterface):
+        self.service = service
+
+    def get(self, key: str):
+        """Получение копии изображения нужного размера, создается при первом запросе"""
+        path, etag, mimetype = self.service.get_image(
+            key, request.args.get('w', type=int), request.args.get('h', type=int), request.args.get('fmt', 'webp'))
+        response = send_file(path, mimetype, etag=etag, conditional=True)
+        response.cache_control.public = True
+        response.cache_control.max_age = 31536000
+        response.cache_control.immutable = True
+        return response
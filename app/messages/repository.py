@@ -1,13 +1,279 @@
+import os
+import socket
+import threading
 from abc import ABC, abstractmethod
+from datetime import datetime, timezone
 
 import sqlalchemy as sa
 import sqlalchemy.orm as so
+from flask import current_app as app, url_for
+from redis import ResponseError
+from sqlalchemy.dialects import postgresql, sqlite
 
-from app import db
-from app.models import Message, User
+from app import db, socketio
+from app.models import Message, User, Conversation
+from app.sync.repository import ChangeRepository
 from app.utils import paginate
 
 
+class ConversationRepositoryInterface(ABC):
+    @abstractmethod
+    def add_messages(self, messages: list[dict]) -> None:
+        pass
+
+    @abstractmethod
+    def get_conversations(self, user: User, before: tuple[datetime, int] | None, per_page: int) -> dict:
+        pass
+
+    @abstractmethod
+    def mark_read(self, user: User, friend: User) -> None:
+        pass
+
+
+class ConversationRepository(ConversationRepositoryInterface):
+    def add_messages(self, messages: list[dict]) -> None:
+        """Обновление последнего сообщения и счетчиков непрочитанных без фиксации транзакции"""
+        conversations = {}
+        # идентификаторы выделяются процессам блоками и не упорядочены по времени, последнее сообщение - по дате
+        for message in sorted(messages, key=lambda m: (m['date'], m['id'])):
+            pair = tuple(sorted((message['sender_id'], message['recipient_id'])))
+            conversation = conversations.setdefault(pair, {
+                'user1_id': pair[0], 'user2_id': pair[1], 'user1_unread': 0, 'user2_unread': 0})
+            conversation['last_message_id'] = message['id']
+            conversation['last_message_at'] = message['date']
+            conversation['user1_unread' if message['recipient_id'] == pair[0] else 'user2_unread'] += 1
+        if not conversations:
+            return
+        insert = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}[db.engine.dialect.name]
+        query = insert(Conversation).values(list(conversations.values()))
+        newer = sa.or_(Conversation.last_message_id.is_(None),
+                       sa.tuple_(query.excluded.last_message_at, query.excluded.last_message_id)
+                       > sa.tuple_(Conversation.last_message_at, Conversation.last_message_id))
+        query = query.on_conflict_do_update(index_elements=['user1_id', 'user2_id'], set_={
+            'last_message_id': sa.case((newer, query.excluded.last_message_id), else_=Conversation.last_message_id),
+            'last_message_at': sa.case((newer, query.excluded.last_message_at), else_=Conversation.last_message_at),
+            'user1_unread': Conversation.user1_unread + query.excluded.user1_unread,
+            'user2_unread': Conversation.user2_unread + query.excluded.user2_unread,
+        })
+        db.session.execute(query)
+
+    def get_conversations(self, user: User, before: tuple[datetime, int] | None, per_page: int) -> dict:
+        """Диалоги пользователя: два поиска по индексам сторон пары, объединенные под общим ограничением"""
+        sides = []
+        for column, friend, unread in ((Conversation.user1_id, Conversation.user2_id, Conversation.user1_unread),
+                                       (Conversation.user2_id, Conversation.user1_id, Conversation.user2_unread)):
+            side = (sa.select(Conversation.id, Conversation.last_message_at, friend.label('friend_id'),
+                              unread.label('unread'))
+                    .where(column == user.id)
+                    .order_by(Conversation.last_message_at.desc(), Conversation.id.desc())
+                    .limit(per_page + 1))
+            if before:
+                side = side.where(sa.tuple_(Conversation.last_message_at, Conversation.id) < before)
+            sides.append(sa.select(side.subquery()))
+        conversations = sa.union_all(*sides).subquery()
+        query = (sa.select(Conversation, User.username, Message.body, conversations.c.unread)
+                 .join(Conversation, Conversation.id == conversations.c.id)
+                 .join(User, User.id == conversations.c.friend_id)
+                 .outerjoin(Message, Message.id == Conversation.last_message_id)
+                 .order_by(conversations.c.last_message_at.desc(), conversations.c.id.desc())
+                 .limit(per_page + 1))
+        rows = db.session.execute(query).all()
+        items = [self.model_to_dict(*row) for row in rows[:per_page]]
+        last = rows[per_page - 1][0] if len(rows) > per_page else None
+        return {
+            'items': items,
+            'meta': {'per_page': per_page},
+            'links': {
+                'self': url_for('conversations', per_page=per_page,
+                                **({'before': before[0].isoformat(), 'before_id': before[1]} if before else {})),
+                'next': url_for('conversations', per_page=per_page, before=last.last_message_at.isoformat(),
+                                before_id=last.id) if last else None,
+            }
+        }
+
+    def mark_read(self, user: User, friend: User) -> None:
+        user1_id, user2_id = sorted((user.id, friend.id))
+        counter = 'user1_unread' if user.id == user1_id else 'user2_unread'
+        db.session.execute(sa.update(Conversation).where(
+            Conversation.user1_id == user1_id, Conversation.user2_id == user2_id).values({counter: 0}))
+        db.session.commit()
+
+    def model_to_dict(self, model: Conversation, username: str, body: str | None, unread: int) -> dict:
+        return {
+            'id': model.id,
+            'user': username,
+            'last_message': {'id': model.last_message_id, 'body': body},
+            'last_message_at': str(model.last_message_at or ''),
+            'unread': unread,
+        }
+
+
+class MessageQueueInterface(ABC):
+    @abstractmethod
+    def push(self, data: dict) -> dict:
+        """Присваивает сообщению идентификатор и дату и ставит его в очередь на сохранение"""
+        pass
+
+    @abstractmethod
+    def flush(self) -> int:
+        """Сохраняет очередную пачку сообщений, возвращает количество сохраненных"""
+        pass
+
+
+class SyncMessageQueue(MessageQueueInterface):
+    """Сообщение сохраняется в базе данных сразу"""
+
+    def __init__(self, conversation_repository: ConversationRepositoryInterface):
+        self.conversation_repository = conversation_repository
+
+    def push(self, data: dict) -> dict:
+        message: Message = Message(**data)
+        db.session.add(message)
+        db.session.flush()
+        data = {**data, 'id': message.id, 'date': message.date}
+        self.conversation_repository.add_messages([data])
+        ChangeRepository().add([data['sender_id'], data['recipient_id']], 'message', message.id, 'created')
+        db.session.commit()
+        return data
+
+    def flush(self) -> int:
+        return 0
+
+
+class RedisMessageQueue(MessageQueueInterface):
+    """Очередь сообщений в потоке Redis, идентификаторы выделяются блоками из последовательности PostgreSQL"""
+    stream = 'messages'
+    group = 'messages:writers'
+    # сообщения, которые не удалось сохранить даже по одному, для ручного разбора
+    dead_letter = 'messages:dead'
+    claim_idle = 60_000
+
+    def __init__(self, conversation_repository: ConversationRepositoryInterface, batch_size: int, interval: int,
+                 id_block: int):
+        self.conversation_repository = conversation_repository
+        self.batch_size = batch_size
+        self.interval = interval
+        self.id_block = id_block
+        self.consumer = f'{socket.gethostname()}:{os.getpid()}'
+        self.ids: list[int] = []
+        self.lock = threading.Lock()
+        try:
+            app.extensions['redis'].xgroup_create(self.stream, self.group, id='0', mkstream=True)
+        except ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+    def next_id(self) -> int:
+        with self.lock:
+            if not self.ids:
+                query = (sa.select(sa.func.nextval('message_id_seq'))
+                         .select_from(sa.func.generate_series(1, self.id_block)))
+                with db.engine.connect() as connection:
+                    self.ids = sorted(connection.scalars(query), reverse=True)
+            return self.ids.pop()
+
+    def push(self, data: dict) -> dict:
+        message = {**data, 'id': self.next_id(), 'date': datetime.now(timezone.utc)}
+        fields = {key: value.isoformat() if isinstance(value, datetime) else str(value)
+                  for key, value in message.items()}
+        app.extensions['redis'].xadd(self.stream, fields)
+        return message
+
+    def read(self) -> list[tuple[str, dict]]:
+        redis = app.extensions['redis']
+        # сообщения, которые прочитал и не подтвердил завершившийся с ошибкой процесс
+        _, entries, *_ = redis.xautoclaim(self.stream, self.group, self.consumer, self.claim_idle,
+                                          count=self.batch_size)
+        if entries:
+            return entries
+        response = redis.xreadgroup(self.group, self.consumer, {self.stream: '>'}, count=self.batch_size)
+        return response[0][1] if response else []
+
+    @staticmethod
+    def parse(fields: dict) -> dict:
+        return {
+            'id': int(fields['id']),
+            'body': fields['body'],
+            'date': datetime.fromisoformat(fields['date']),
+            'sender_id': int(fields['sender_id']),
+            'recipient_id': int(fields['recipient_id']),
+        }
+
+    def save(self, rows: list[dict]) -> None:
+        """Запись пачки одной транзакцией, при повторной обработке после сбоя счетчики обновляются только для новых"""
+        insert = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}[db.engine.dialect.name]
+        result = db.session.execute(insert(Message).on_conflict_do_nothing(index_elements=['id'])
+                                    .returning(Message.id), rows)
+        inserted = set(result.scalars())
+        inserted_rows = [row for row in rows if row['id'] in inserted]
+        self.conversation_repository.add_messages(inserted_rows)
+        ChangeRepository().add_many([
+            {'user_id': user_id, 'entity': 'message', 'entity_id': row['id'], 'action': 'created'}
+            for row in inserted_rows for user_id in (row['sender_id'], row['recipient_id'])])
+        db.session.commit()
+
+    def flush(self) -> int:
+        entries = self.read()
+        if not entries:
+            return 0
+        rows: dict[str, dict] = {}
+        failed: list[tuple[str, dict, Exception]] = []
+        for entry_id, fields in entries:
+            try:
+                rows[entry_id] = self.parse(fields)
+            except (KeyError, ValueError) as e:
+                failed.append((entry_id, fields, e))
+        try:
+            if rows:
+                self.save(list(rows.values()))
+        except (sa.exc.IntegrityError, sa.exc.DataError):
+            db.session.rollback()
+            # одна ошибочная строка не должна останавливать всю пачку: сообщения сохраняются по одному
+            fields_by_id = dict(entries)
+            for entry_id, row in rows.items():
+                try:
+                    self.save([row])
+                except (sa.exc.IntegrityError, sa.exc.DataError) as e:
+                    db.session.rollback()
+                    failed.append((entry_id, fields_by_id[entry_id], e))
+        ids = [entry_id for entry_id, _ in entries]
+        pipeline = app.extensions['redis'].pipeline()
+        for entry_id, fields, error in failed:
+            app.logger.error('Сообщение %s не сохранено и перемещено в %s: %s', entry_id, self.dead_letter, error)
+            pipeline.xadd(self.dead_letter, {**fields, 'entry_id': entry_id, 'error': str(error)[:1000]})
+        pipeline.xack(self.stream, self.group, *ids)
+        pipeline.xdel(self.stream, *ids)
+        pipeline.execute()
+        return len(entries)
+
+    def run(self, flask_app) -> None:
+        """Фоновая запись: пачка сохраняется каждые interval мс или сразу после набора batch_size сообщений"""
+        with flask_app.app_context():
+            while True:
+                try:
+                    count = self.flush()
+                except Exception:
+                    count = 0
+                    db.session.rollback()
+                    flask_app.logger.exception('Ошибка сохранения сообщений')
+                finally:
+                    db.session.remove()
+                if count < self.batch_size:
+                    socketio.sleep(self.interval / 1000)
+
+
+def get_message_queue() -> MessageQueueInterface:
+    if 'message_queue' not in app.extensions:
+        if app.config['MESSAGE_QUEUE'] == 'redis' and db.engine.dialect.name == 'postgresql':
+            queue = RedisMessageQueue(ConversationRepository(), app.config['MESSAGE_BATCH_SIZE'],
+                                      app.config['MESSAGE_BATCH_INTERVAL'], app.config['MESSAGE_ID_BLOCK'])
+            socketio.start_background_task(queue.run, app._get_current_object())
+            app.extensions['message_queue'] = queue
+        else:
+            app.extensions['message_queue'] = SyncMessageQueue(ConversationRepository())
+    return app.extensions['message_queue']
+
+
 class MessageRepositoryInterface(ABC):
     @abstractmethod
     def paginate_by_filters(
@@ -18,6 +284,10 @@ class MessageRepositoryInterface(ABC):
     def get_messages(self, user: User, friend: User) -> sa.Select[tuple[Message]]:
         pass
 
+    @abstractmethod
+    def get_history(self, user: User, friend: User, before: int | None, per_page: int) -> dict:
+        pass
+
     @abstractmethod
     def add(self, data: dict) -> Message:
         pass
@@ -28,9 +298,17 @@ class MessageRepositoryInterface(ABC):
 
 
 class MessageRepository(MessageRepositoryInterface):
+    conversation_repository: ConversationRepositoryInterface
+
+    def __init__(self, conversation_repository: ConversationRepositoryInterface):
+        self.conversation_repository = conversation_repository
+
     def add(self, data: dict) -> Message:
         message: Message = Message(**data)
         db.session.add(message)
+        db.session.flush()
+        self.conversation_repository.add_messages([{**data, 'id': message.id, 'date': message.date}])
+        ChangeRepository().add([message.sender_id, message.recipient_id], 'message', message.id, 'created')
         db.session.commit()
         return message
 
@@ -38,6 +316,38 @@ class MessageRepository(MessageRepositoryInterface):
         return sa.select(Message).where(sa.or_(sa.and_(Message.sender == user, Message.recipient == friend),
                                                sa.and_(Message.sender == friend, Message.recipient == user)))
 
+    def get_history(self, user: User, friend: User, before: int | None, per_page: int) -> dict:
+        """Сообщения диалога старше сообщения before, поиск по индексу пары пользователей без OFFSET"""
+        if db.engine.dialect.name == 'postgresql':
+            least, greatest = sa.func.least, sa.func.greatest
+        else:
+            least, greatest = sa.func.min, sa.func.max
+        query = (sa.select(Message)
+                 .where(least(Message.sender_id, Message.recipient_id) == min(user.id, friend.id),
+                        greatest(Message.sender_id, Message.recipient_id) == max(user.id, friend.id))
+                 .order_by(Message.date.desc(), Message.id.desc())
+                 .limit(per_page + 1))
+        if before:
+            date = sa.select(Message.date).where(Message.id == before).scalar_subquery()
+            query = query.where(sa.tuple_(Message.date, Message.id) < sa.tuple_(date, before))
+        messages = db.session.scalars(query).all()
+        items = [{
+            'id': message.id,
+            'body': message.body,
+            'date': str(message.date or ''),
+            'sender': user.username if message.sender_id == user.id else friend.username,
+            'recipient': friend.username if message.sender_id == user.id else user.username,
+        } for message in messages[:per_page]]
+        return {
+            'items': items,
+            'meta': {'per_page': per_page},
+            'links': {
+                'self': url_for('messages', username=friend.username, before=before or '', per_page=per_page),
+                'next': url_for('messages', username=friend.username, before=messages[per_page - 1].id,
+                                per_page=per_page) if len(messages) > per_page else None,
+            }
+        }
+
     def paginate_by_filters(
             self, page: int, per_page: int, query: sa.Select[tuple[Message]] = sa.select(Message)) -> dict:
         return paginate(query.options(so.joinedload(Message.sender), so.joinedload(Message.recipient)), Message, self,
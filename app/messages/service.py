@@ -1,7 +1,9 @@
 from abc import ABC, abstractmethod
+from datetime import datetime
+
 from flask import g, abort
 
-from app.messages.repository import MessageRepositoryInterface
+from app.messages.repository import MessageRepositoryInterface, ConversationRepositoryInterface
 from app.models import Message, User
 from app.users.repository import UserRepositoryInterface
 
@@ -9,20 +11,35 @@ from app.users.repository import UserRepositoryInterface
 class MessageServiceInterface(ABC):
     message_repository: MessageRepositoryInterface
     user_repository: UserRepositoryInterface
+    conversation_repository: ConversationRepositoryInterface
 
     @abstractmethod
     def get_messages(self, username: str, page: int, per_page: int) -> dict:
         pass
 
+    @abstractmethod
+    def get_history(self, username: str, before: int | None, per_page: int) -> dict:
+        pass
+
     @abstractmethod
     def add_message(self, data: dict) -> dict:
         pass
 
+    @abstractmethod
+    def get_conversations(self, before: datetime | None, before_id: int | None, per_page: int) -> dict:
+        pass
+
+    @abstractmethod
+    def read_conversation(self, username: str) -> None:
+        pass
+
 
 class MessageService(MessageServiceInterface):
-    def __init__(self, message_repository: MessageRepositoryInterface, user_repository: UserRepositoryInterface):
+    def __init__(self, message_repository: MessageRepositoryInterface, user_repository: UserRepositoryInterface,
+                 conversation_repository: ConversationRepositoryInterface):
         self.message_repository = message_repository
         self.user_repository = user_repository
+        self.conversation_repository = conversation_repository
 
     def add_message(self, data: dict) -> dict:
         recipient: User = self.user_repository.get_by_username(data.get('recipient'))
@@ -42,3 +59,17 @@ class MessageService(MessageServiceInterface):
             abort(403, 'У Вас нет прав доступа')
         return self.message_repository.paginate_by_filters(page, per_page,
                                                            self.message_repository.get_messages(g.current_user, user))
+
+    def get_history(self, username: str, before: int | None, per_page: int) -> dict:
+        user: User = self.user_repository.get_by_username(username)
+        if not self.user_repository.is_friend(g.current_user, user):
+            abort(403, 'У Вас нет прав доступа')
+        return self.message_repository.get_history(g.current_user, user, before, per_page)
+
+    def get_conversations(self, before: datetime | None, before_id: int | None, per_page: int) -> dict:
+        cursor = (before, before_id) if before and before_id else None
+        return self.conversation_repository.get_conversations(g.current_user, cursor, per_page)
+
+    def read_conversation(self, username: str) -> None:
+        user: User = self.user_repository.get_by_username(username)
+        self.conversation_repository.mark_read(g.current_user, user)
@@ -1,21 +1,72 @@
 import os
-from unittest import TestCase, main
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from unittest import TestCase, main, skipIf
 
+import sqlalchemy as sa
 from flask import g
 
-from app import create_app, db
-from app.messages.repository import MessageRepository
+import socketio as socketio_client
+from socketio import RedisManager
+
+from app import create_app, create_worker_app, db, socketio
+from app.auth.utils import generate_token
+from app.messages.repository import MessageRepository, ConversationRepository, RedisMessageQueue
 from app.messages.service import MessageService
-from app.models import User, Message
+from app.models import User, Message, Conversation
 from app.users.repository import UserRepository
 from config import TestConfig
 
+try:
+    from fakeredis import FakeRedis, TcpFakeServer
+except ImportError:
+    FakeRedis = TcpFakeServer = None
+
+# отдельный процесс веб-сервера, как один из воркеров gunicorn с eventlet
+WORKER = '''
+import eventlet
+eventlet.monkey_patch()
+from app import create_app, socketio
+from config import TestConfig
+
+class WorkerConfig(TestConfig):
+    SQLALCHEMY_DATABASE_URI = {database!r}
+    SOCKETIO_MESSAGE_QUEUE = {queue!r}
+
+socketio.run(create_app(WorkerConfig), port={port}, log_output=False)
+'''
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
 
 class MessageModelCase(TestCase):
     def setUp(self):
         self.app = create_app(TestConfig)
         self.app_context = self.app.app_context()
-        self.service = MessageService(MessageRepository(), UserRepository())
+        conversation_repository = ConversationRepository()
+        self.service = MessageService(MessageRepository(conversation_repository), UserRepository(),
+                                      conversation_repository)
         self.app_context.push()
         db.create_all()
 
@@ -74,6 +125,226 @@ class MessageModelCase(TestCase):
             message: Message = db.session.get(Message, result["id"])
             self.assertEqual(message.body, "Привет")
 
+    def test_get_history(self):
+        with self.app.app_context(), self.app.test_request_context():
+            user1: User = User(username="ivan", email="ivan@example.com", firstname="Иван", lastname="Петров")
+            user2: User = User(username="petr", email="petr@example.com", firstname="Петр", lastname="Иванов")
+            user1.following.add(user2)
+            user2.following.add(user1)
+            db.session.add_all([user1, user2])
+            db.session.commit()
+            date = datetime(2024, 1, 1)
+            for i in range(5):
+                sender, recipient = (user1, user2) if i % 2 else (user2, user1)
+                db.session.add(Message(body=f"Сообщение {i}", sender=sender, recipient=recipient, date=date))
+            db.session.commit()
+            g.current_user = user1
+            result: dict = self.service.get_history("petr", None, 2)
+            self.assertEqual([item["body"] for item in result["items"]], ["Сообщение 4", "Сообщение 3"])
+            before = result["items"][-1]["id"]
+            result = self.service.get_history("petr", before, 2)
+            self.assertEqual([item["body"] for item in result["items"]], ["Сообщение 2", "Сообщение 1"])
+            self.assertEqual(result["items"][1]["sender"], "ivan")
+            result = self.service.get_history("petr", result["items"][-1]["id"], 2)
+            self.assertEqual([item["body"] for item in result["items"]], ["Сообщение 0"])
+            self.assertIsNone(result["links"]["next"])
+
+        # без before ответ остается постраничным, как у существующих клиентов
+        client = self.app.test_client()
+        headers = {"Authorization": f"Bearer {generate_token(user1.id, 60)}"}
+        response = client.get("/api/messages?username=petr&per_page=2", headers=headers)
+        self.assertEqual(response.json["meta"]["total_pages"], 3)
+        self.assertIn("prev", response.json["links"])
+        response = client.get("/api/messages?username=petr&per_page=2&before=", headers=headers)
+        self.assertNotIn("total_pages", response.json["meta"])
+        self.assertEqual([item["body"] for item in response.json["items"]], ["Сообщение 4", "Сообщение 3"])
+        self.assertIn("before=", response.json["links"]["self"])
+        response = client.get(response.json["links"]["next"], headers=headers)
+        self.assertEqual([item["body"] for item in response.json["items"]], ["Сообщение 2", "Сообщение 1"])
+
+    def test_get_conversations(self):
+        with self.app.app_context(), self.app.test_request_context():
+            users = [User(username=name, email=f"{name}@example.com", firstname="Иван", lastname="Петров")
+                     for name in ("ivan", "petr", "alex")]
+            for friend in users[1:]:
+                users[0].following.add(friend)
+                friend.following.add(users[0])
+            db.session.add_all(users)
+            db.session.commit()
+            for user in users:
+                g.current_user = user
+                if user is users[0]:
+                    self.service.add_message({"body": "Привет", "recipient": "petr"})
+                    self.service.add_message({"body": "Привет", "recipient": "alex"})
+                else:
+                    self.service.add_message({"body": "Здравствуйте", "recipient": "ivan"})
+            g.current_user = users[0]
+            result: dict = self.service.get_conversations(None, None, 1)
+            self.assertEqual(len(result["items"]), 1)
+            self.assertEqual(result["items"][0]["user"], "alex")
+            self.assertEqual(result["items"][0]["last_message"]["body"], "Здравствуйте")
+            self.assertEqual(result["items"][0]["unread"], 1)
+            cursor = result["items"][0]
+            before = db.session.get(Conversation, cursor["id"]).last_message_at
+            result = self.service.get_conversations(before, cursor["id"], 1)
+            self.assertEqual(result["items"][0]["user"], "petr")
+            self.assertIsNone(result["links"]["next"])
+            self.service.read_conversation("petr")
+            result = self.service.get_conversations(None, None, 2)
+            self.assertEqual([item["unread"] for item in result["items"]], [1, 0])
+            g.current_user = users[1]
+            result = self.service.get_conversations(None, None, 2)
+            self.assertEqual(result["items"][0]["unread"], 1)
+            # у petr диалоги с обеих сторон пары: с ivan он второй участник, с alex - первый
+            users[1].following.add(users[2])
+            users[2].following.add(users[1])
+            db.session.commit()
+            g.current_user = users[2]
+            self.service.add_message({"body": "Добрый день", "recipient": "petr"})
+            g.current_user = users[1]
+            result = self.service.get_conversations(None, None, 1)
+            self.assertEqual([item["user"] for item in result["items"]], ["alex"])
+            cursor = result["items"][0]
+            before = db.session.get(Conversation, cursor["id"]).last_message_at
+            result = self.service.get_conversations(before, cursor["id"], 1)
+            self.assertEqual([item["user"] for item in result["items"]], ["ivan"])
+            self.assertIsNone(result["links"]["next"])
+
+    def test_chat(self):
+        sender: User = User(username="ivan", email="ivan@example.com", firstname="Иван", lastname="Петров")
+        recipient: User = User(username="petr", email="petr@example.com", firstname="Петр", lastname="Иванов")
+        sender.following.add(recipient)
+        recipient.following.add(sender)
+        db.session.add_all([sender, recipient])
+        db.session.commit()
+        client = socketio.test_client(self.app, namespace='/chat')
+        self.assertFalse(client.is_connected('/chat'))
+        client = socketio.test_client(self.app, namespace='/chat', auth={'token': generate_token(sender.id, 10)})
+        self.assertTrue(client.is_connected('/chat'))
+        devices = [socketio.test_client(self.app, namespace='/chat', auth={'token': generate_token(recipient.id, 10)})
+                   for _ in range(2)]
+        client.send({'recipient': 'alex', 'body': 'Привет'}, namespace='/chat')
+        client.send({'recipient': 'petr', 'body': 'Привет'}, namespace='/chat')
+        for received in [client.get_received('/chat')] + [device.get_received('/chat') for device in devices]:
+            self.assertEqual(len(received), 1)
+            self.assertEqual(received[0]['args']['data_message']['sender'], 'ivan')
+            self.assertEqual(received[0]['args']['data_message']['recipient'], 'petr')
+        self.assertEqual(db.session.scalar(sa.select(sa.func.count(Message.id))), 1)
+
+    @skipIf(FakeRedis is None, "fakeredis не установлен")
+    def test_redis_message_queue(self):
+        redis = FakeRedis(decode_responses=True)
+        self.app.extensions['redis'] = redis
+        user1: User = User(username="ivan", email="ivan@example.com", firstname="Иван", lastname="Петров")
+        user2: User = User(username="petr", email="petr@example.com", firstname="Петр", lastname="Иванов")
+        db.session.add_all([user1, user2])
+        db.session.commit()
+        queue = RedisMessageQueue(ConversationRepository(), 10, 100, 10)
+        # последовательность идентификаторов есть только в PostgreSQL, блок выделен заранее
+        queue.ids = [6, 5, 4, 3, 2, 1]
+        queue.push({'sender_id': user1.id, 'recipient_id': user2.id, 'body': "Привет"})
+        queue.push({'sender_id': user2.id, 'recipient_id': user1.id, 'body': "Здравствуйте"})
+
+        # другой процесс прочитал сообщения и завершился, не подтвердив их
+        RedisMessageQueue(ConversationRepository(), 10, 100, 10).read()
+        self.assertEqual(redis.xpending(queue.stream, queue.group)['pending'], 2)
+        queue.consumer = 'writer'
+        queue.claim_idle = 0
+        self.assertEqual(queue.flush(), 2)
+        self.assertEqual(db.session.scalars(sa.select(Message.body).order_by(Message.id)).all(),
+                         ["Привет", "Здравствуйте"])
+        self.assertEqual(redis.xlen(queue.stream), 0)
+        self.assertEqual(redis.xpending(queue.stream, queue.group)['pending'], 0)
+
+        # сообщение удаленного пользователя не должно блокировать остальные сообщения пачки
+        with db.engine.connect() as connection:
+            connection.exec_driver_sql('PRAGMA foreign_keys=ON')
+        queue.push({'sender_id': 999, 'recipient_id': user1.id, 'body': "Потерянное"})
+        queue.push({'sender_id': user1.id, 'recipient_id': user2.id, 'body': "Как дела?"})
+        self.assertEqual(queue.flush(), 2)
+        self.assertIsNotNone(db.session.get(Message, 4))
+        self.assertIsNone(db.session.get(Message, 3))
+        dead = redis.xrange(queue.dead_letter)
+        self.assertEqual([fields['body'] for _, fields in dead], ["Потерянное"])
+        self.assertEqual(redis.xlen(queue.stream), 0)
+
+        # блок идентификаторов другого процесса: больший идентификатор у более раннего сообщения
+        queue.ids = [7, 8]
+        queue.push({'sender_id': user2.id, 'recipient_id': user1.id, 'body': "Раньше"})
+        queue.flush()
+        queue.push({'sender_id': user1.id, 'recipient_id': user2.id, 'body': "Позже"})
+        queue.flush()
+        conversation = db.session.scalar(sa.select(Conversation))
+        self.assertEqual(conversation.last_message_id, 7)
+        self.assertEqual(conversation.user2_unread, 3)
+        with db.engine.connect() as connection:
+            connection.exec_driver_sql('PRAGMA foreign_keys=OFF')
+
+    def test_message_queue(self):
+        class QueueConfig(TestConfig):
+            SOCKETIO_MESSAGE_QUEUE = 'redis://localhost:6379/1'
+
+        # init_app меняет настройки общего объекта socketio, следующие тесты должны получить их прежними
+        self.addCleanup(setattr, socketio, 'server', socketio.server)
+        self.addCleanup(setattr, socketio, 'server_options', dict(socketio.server_options))
+        create_app(QueueConfig)
+        self.assertIsInstance(socketio.server.manager, RedisManager)
+        self.assertEqual(socketio.server.manager.channel, TestConfig.SOCKETIO_CHANNEL)
+
+    @skipIf(TcpFakeServer is None, "fakeredis не установлен")
+    def test_message_queue_between_workers(self):
+        redis = TcpFakeServer(('127.0.0.1', 0))
+        threading.Thread(target=redis.serve_forever, daemon=True).start()
+        self.addCleanup(redis.server_close)
+        self.addCleanup(redis.shutdown)
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        database = f"sqlite:///{os.path.join(folder.name, 'chat.db')}"
+
+        class WorkerConfig(TestConfig):
+            SQLALCHEMY_DATABASE_URI = database
+
+        with create_worker_app(WorkerConfig).app_context():
+            db.create_all()
+            user1: User = User(username="ivan", email="ivan@example.com", firstname="Иван", lastname="Петров")
+            user2: User = User(username="petr", email="petr@example.com", firstname="Петр", lastname="Иванов")
+            user1.following.add(user2)
+            user2.following.add(user1)
+            db.session.add_all([user1, user2])
+            db.session.commit()
+            tokens = [generate_token(user1.id, 60), generate_token(user2.id, 60)]
+            db.session.remove()
+
+        host, port = redis.server_address
+        ports = [free_port(), free_port()]
+        for worker_port in ports:
+            code = WORKER.format(database=database, queue=f"redis://{host}:{port}/0", port=worker_port)
+            process = subprocess.Popen([sys.executable, '-c', code], cwd=os.path.dirname(os.path.dirname(
+                os.path.dirname(os.path.abspath(__file__)))))
+            self.addCleanup(process.wait)
+            self.addCleanup(process.terminate)
+        for worker_port in ports:
+            wait_for_port(worker_port)
+
+        received = threading.Event()
+        sender, recipient = socketio_client.Client(), socketio_client.Client()
+
+        @recipient.on('message', namespace='/chat')
+        def on_message(data):
+            if data['data_message']['body'] == "Привет":
+                received.set()
+
+        for client, worker_port, token in zip((sender, recipient), ports, tokens):
+            client.connect(f"http://127.0.0.1:{worker_port}", namespaces=['/chat'], auth={"token": token},
+                           transports=['polling'])
+            self.addCleanup(client.disconnect)
+        # второй воркер подписывается на канал Redis в фоне, сообщение повторяется, пока подписка не готова
+        for _ in range(20):
+            sender.emit('message', {'recipient': 'petr', 'body': "Привет"}, namespace='/chat')
+            if received.wait(0.5):
+                break
+        self.assertTrue(received.is_set())
+
 
 if __name__ == '__main__':
     main(verbosity=2)
@@ -1,66 +1,52 @@
+from datetime import datetime
+
 import jwt
-import sqlalchemy as sa
-from flask import request, current_app as app
+from flask import request, session, current_app as app
 from flask.views import MethodView
-from flask_socketio import send, join_room, leave_room
+from flask_socketio import send, join_room
 
-from app import socketio, db
+from app import socketio
 from app.auth import token_auth
-from app.messages.repository import MessageRepository
+from app.auth.utils import decode_token
+from app.messages.repository import get_message_queue
 from app.messages.service import MessageServiceInterface
-from app.models import User, Message
-from app.users.repository import UserRepository
+from app.models import User
 
 
-@socketio.on('joined', namespace='/chat')
-def joined(data):
-    sender: User = db.session.scalars(sa.select(User).filter_by(username=data["sender"])).first()
-    recipient: User = db.session.scalars(sa.select(User).filter_by(username=data["recipient"])).first()
-    repo = UserRepository()
-    friends = db.session.scalars(repo.get_friends(sender)).all()
-    if recipient and recipient in friends:
-        to_room: str = f"{sender.username}:{recipient.username}"
-        from_room: str = f"{recipient.username}:{sender.username}"
-        join_room(to_room)
-        join_room(from_room)
+@socketio.on('connect', namespace='/chat')
+def connect(auth):
+    """Проверка токена при подключении, соединение попадает в комнату пользователя"""
+    token = (auth or {}).get("token") or request.args.get("token")
+    if not token:
+        return False
+    try:
+        payload = decode_token(token)
+    except jwt.InvalidTokenError:
+        return False
+    user: User = app.user_repo.get_cached_by_id(payload["id"])
+    if user is None:
+        return False
+    session["user_id"] = user.id
+    session["username"] = user.username
+    join_room(f"user:{user.id}")
 
 
 @socketio.on('message', namespace='/chat')
 def send_message(data):
     if data:
-        token = data.get("token")
-        if token:
-            try:
-                payload = jwt.decode(token, app.config.get('SECRET_KEY'), algorithms=["HS256"])
-                repo = UserRepository()
-                sender: User = repo.get_by_id(payload["id"])
-            except jwt.DecodeError:
-                return False
-            except jwt.ExpiredSignatureError:
-                return False
-            except jwt.InvalidTokenError:
-                return False
-            # sender: User = db.session.scalars(sa.select(User).filter_by(username=data["sender"])).first()
-            recipient: User = db.session.scalars(sa.select(User).filter_by(username=data["recipient"])).first()
-            body: str = data["body"]
-            repo = MessageRepository()
-            message: Message = Message(recipient_id=recipient.id, sender_id=sender.id, body=body)
-            db.session.add(message)
-            db.session.commit()
-            response: dict = repo.model_to_dict(message)
-            if message:
-                room: str = f"{sender.username}:{recipient.username}"
-                send({'data_message': response}, to=room)
-
-
-@socketio.on('left', namespace='/chat')
-def left(data):
-    sender: User = db.session.scalars(sa.select(User).filter_by(username=data["sender"])).first()
-    recipient: User = db.session.scalars(sa.select(User).filter_by(username=data["recipient"])).first()
-    to_room: str = f"{sender.username}:{recipient.username}"
-    from_room: str = f"{recipient.username}:{sender.username}"
-    leave_room(to_room)
-    leave_room(from_room)
+        recipient_id = app.user_repo.get_friend_id(session["user_id"], data.get("recipient"))
+        if recipient_id is None:
+            return False
+        message: dict = get_message_queue().push(
+            {'recipient_id': recipient_id, 'sender_id': session["user_id"], 'body': data["body"]})
+        response: dict = {
+            'id': message['id'],
+            'body': message['body'],
+            'date': str(message['date'] or ''),
+            'sender': session["username"],
+            'recipient': data["recipient"],
+        }
+        send({'data_message': response}, to=[f"user:{recipient_id}", f"user:{session['user_id']}"])
 
 
 class MessagesAPI(MethodView):
@@ -73,8 +59,41 @@ class MessagesAPI(MethodView):
         self.service = service
 
     def get(self):
-        """Получение списка сообщений диалога"""
-        page = request.args.get('page', 1, type=int)
+        """Получение списка сообщений диалога, с параметром before (пустым для первой страницы) - по курсору"""
         per_page = min(request.args.get('per_page', 6, type=int), 100)
         username = request.args.get('username')
-        return self.service.get_messages(username, page, per_page)
+        if 'before' in request.args:
+            return self.service.get_history(username, request.args.get('before', type=int), per_page)
+        return self.service.get_messages(username, request.args.get('page', 1, type=int), per_page)
+
+
+class ConversationsAPI(MethodView):
+    init_every_request = False
+    decorators = [token_auth.login_required]
+
+    service: MessageServiceInterface
+
+    def __init__(self, service: MessageServiceInterface):
+        self.service = service
+
+    def get(self):
+        """Получение списка диалогов, отсортированных по времени последнего сообщения"""
+        per_page = min(request.args.get('per_page', 20, type=int), 100)
+        before = request.args.get('before', type=datetime.fromisoformat)
+        before_id = request.args.get('before_id', type=int)
+        return self.service.get_conversations(before, before_id, per_page)
+
+
+class ConversationAPI(MethodView):
+    init_every_request = False
+    decorators = [token_auth.login_required]
+
+    service: MessageServiceInterface
+
+    def __init__(self, service: MessageServiceInterface):
+        self.service = service
+
+    def put(self, username):
+        """Отметка о прочтении диалога"""
+        self.service.read_conversation(username)
+        return {'message': 'Диалог прочитан'}
@@ -0,0 +1,20 @@
+import os
+from wsgiref.simple_server import WSGIServer
+
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Histogram, multiprocess, start_http_server
+
+sessions_reaped = Counter('flygram_sessions_reaped_total', 'Удаленные истекшие сеансы')
+sessions_reaped_per_run = Histogram('flygram_sessions_reaped_per_run', 'Удаленные истекшие сеансы за один запуск',
+                                    buckets=(0, 10, 100, 1_000, 10_000, 100_000))
+media_files_collected = Counter('flygram_media_files_collected_total', 'Удаленные неиспользуемые файлы хранилища')
+media_bytes_reclaimed = Counter('flygram_media_bytes_reclaimed_total', 'Освобожденный объем хранилища в байтах')
+
+
+def start_metrics_server(port: int) -> WSGIServer:
+    """HTTP-сервер метрик в главном процессе обработчика, значения дочерних процессов - из PROMETHEUS_MULTIPROC_DIR"""
+    registry = REGISTRY
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    server, _ = start_http_server(port, registry=registry)
+    return server
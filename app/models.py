@@ -49,6 +49,30 @@ class Message(db.Model):
                                                    foreign_keys="Message.recipient_id")
 
 
+# история диалога: пара пользователей без учета направления, затем дата и идентификатор для курсора
+sa.Index('ix_message_conversation_date_id', sa.func.least(Message.sender_id, Message.recipient_id),
+         sa.func.greatest(Message.sender_id, Message.recipient_id), Message.date, Message.id
+         ).ddl_if(dialect='postgresql')
+
+
+class Conversation(db.Model):
+    __table_args__ = (
+        sa.UniqueConstraint('user1_id', 'user2_id'),
+        # по одному индексу на каждую сторону пары: список диалогов объединяет два упорядоченных поиска по индексу
+        sa.Index('ix_conversation_user1_id_last_message_at_id', 'user1_id', 'last_message_at', 'id'),
+        sa.Index('ix_conversation_user2_id_last_message_at_id', 'user2_id', 'last_message_at', 'id'),
+    )
+
+    id: so.Mapped[int] = so.mapped_column(primary_key=True)
+    # пара пользователей упорядочена: user1_id < user2_id
+    user1_id: so.Mapped[int] = so.mapped_column(sa.ForeignKey("user.id", ondelete='cascade'))
+    user2_id: so.Mapped[int] = so.mapped_column(sa.ForeignKey("user.id", ondelete='cascade'))
+    last_message_id: so.Mapped[Optional[int]] = so.mapped_column(sa.ForeignKey(Message.id, ondelete='set null'))
+    last_message_at: so.Mapped[datetime] = so.mapped_column(default=lambda: datetime.now(timezone.utc))
+    user1_unread: so.Mapped[int] = so.mapped_column(default=0, server_default='0')
+    user2_unread: so.Mapped[int] = so.mapped_column(default=0, server_default='0')
+
+
 class User(db.Model):
     id: so.Mapped[int] = so.mapped_column(primary_key=True)
     username: so.Mapped[str] = so.mapped_column(sa.String(32), index=True, unique=True)
@@ -57,7 +81,8 @@ class User(db.Model):
     lastname: so.Mapped[str] = so.mapped_column(sa.String(32), index=True)
     phone_number: so.Mapped[Optional[str]] = so.mapped_column(sa.String(20))
     date_birth: so.Mapped[Optional[datetime]] = so.mapped_column(sa.Date)
-    avatar_url: so.Mapped[Optional[str]] = so.mapped_column(sa.String(100))
+    avatar_url: so.Mapped[Optional[str]] = so.mapped_column(sa.String(255))
+    avatar_renditions: so.Mapped[Optional[dict]] = so.mapped_column(sa.JSON)
     city: so.Mapped[Optional[str]] = so.mapped_column(sa.String(100), index=True)
     address: so.Mapped[Optional[str]] = so.mapped_column(sa.String(100))
     education: so.Mapped[Optional[str]] = so.mapped_column(sa.String(100))
@@ -71,7 +96,6 @@ class User(db.Model):
         index=True, default=lambda: datetime.now(timezone.utc))
     verified_email: so.Mapped[bool] = so.mapped_column(default=False, server_default=sa.sql.false())
     two_factor_enabled: so.Mapped[bool] = so.mapped_column(default=False, server_default=sa.sql.false())
-    two_factor_code: so.Mapped[Optional[int]]
     posts: so.WriteOnlyMapped['Post'] = so.relationship(back_populates='author', passive_deletes=True)
     liked_posts: so.WriteOnlyMapped['Post'] = so.relationship(secondary=likes,
                                                               back_populates='liked_users', passive_deletes=True)
@@ -98,7 +122,8 @@ class Community(db.Model):
     name: so.Mapped[int] = so.mapped_column(sa.String(32), index=True)
     description: so.Mapped[str] = so.mapped_column(sa.String(500))
     register_date: so.Mapped[datetime] = so.mapped_column(index=True, default=lambda: datetime.now(timezone.utc))
-    image_url: so.Mapped[Optional[str]] = so.mapped_column(sa.String(100))
+    image_url: so.Mapped[Optional[str]] = so.mapped_column(sa.String(255))
+    image_renditions: so.Mapped[Optional[dict]] = so.mapped_column(sa.JSON)
     user_id: so.Mapped[int] = so.mapped_column(sa.ForeignKey(User.id, ondelete='cascade'), index=True)
     owner: so.Mapped[User] = so.relationship(back_populates='own_communities')
     members: so.WriteOnlyMapped['User'] = so.relationship(
@@ -109,7 +134,8 @@ class Community(db.Model):
 class Post(db.Model):
     id: so.Mapped[int] = so.mapped_column(primary_key=True, index=True)
     text: so.Mapped[str] = so.mapped_column(sa.String(500))
-    image_url: so.Mapped[Optional[str]] = so.mapped_column(sa.String(100))
+    image_url: so.Mapped[Optional[str]] = so.mapped_column(sa.String(255))
+    image_renditions: so.Mapped[Optional[dict]] = so.mapped_column(sa.JSON)
     hashtags: so.Mapped[str] = so.mapped_column(sa.String(100))
     publication_date: so.Mapped[datetime] = so.mapped_column(
         index=True, default=lambda: datetime.now(timezone.utc))
@@ -136,10 +162,12 @@ class Comment(db.Model):
 
 
 class Session(db.Model):
+    __table_args__ = (sa.Index('ix_session_user_id_created_at', 'user_id', 'created_at'),)
+
     id: so.Mapped[uuid.UUID] = so.mapped_column(sa.Uuid, primary_key=True, default=uuid.uuid4, index=True)
     platform: so.Mapped[Optional[str]] = so.mapped_column(sa.String(200))
     ip: so.Mapped[str] = so.mapped_column(sa.String(100))
-    expires: so.Mapped[datetime] = so.mapped_column(default=lambda: datetime.now(
+    expires: so.Mapped[datetime] = so.mapped_column(index=True, default=lambda: datetime.now(
         timezone.utc) + timedelta(days=app.config.get('SESSION_LIFETIME')))
     user_id: so.Mapped[int] = so.mapped_column(sa.ForeignKey(User.id, ondelete='cascade'), index=True)
     user: so.Mapped[User] = so.relationship(back_populates='sessions')
@@ -153,3 +181,33 @@ class Vacancy(db.Model):
     user_id: so.Mapped[int] = so.mapped_column(sa.ForeignKey(User.id, ondelete='cascade'), index=True)
     employer: so.Mapped[User] = so.relationship(back_populates='vacancies')
     date: so.Mapped[datetime] = so.mapped_column(index=True, default=lambda: datetime.now(timezone.utc))
+
+
+# журнал изменений для инкрементальной синхронизации, записи только добавляются
+class Change(db.Model):
+    __table_args__ = (sa.Index('ix_change_user_id_xid_id', 'user_id', 'xid', 'id'),)
+
+    id: so.Mapped[int] = so.mapped_column(sa.BigInteger().with_variant(sa.Integer, 'sqlite'), primary_key=True)
+    # транзакция PostgreSQL, добавившая запись (pg_current_xact_id), в SQLite - 0
+    xid: so.Mapped[int] = so.mapped_column(sa.BigInteger().with_variant(sa.Integer, 'sqlite'), default=0,
+                                           server_default='0')
+    # пользователь, к которому относится изменение: участник диалога, автор публикации, автор отметки
+    user_id: so.Mapped[int] = so.mapped_column(sa.ForeignKey(User.id, ondelete='cascade'))
+    entity: so.Mapped[str] = so.mapped_column(sa.String(16))
+    entity_id: so.Mapped[int]
+    action: so.Mapped[str] = so.mapped_column(sa.String(8))
+    date: so.Mapped[datetime] = so.mapped_column(index=True, default=lambda: datetime.now(timezone.utc))
+
+
+class Upload(db.Model):
+    id: so.Mapped[uuid.UUID] = so.mapped_column(sa.Uuid, primary_key=True, default=uuid.uuid4)
+    user_id: so.Mapped[int] = so.mapped_column(sa.ForeignKey(User.id, ondelete='cascade'), index=True)
+    length: so.Mapped[int]
+    offset: so.Mapped[int] = so.mapped_column(default=0, server_default='0')
+    # ключи частей в хранилище в порядке загрузки
+    parts: so.Mapped[list] = so.mapped_column(sa.JSON, default=list)
+    extension: so.Mapped[Optional[str]] = so.mapped_column(sa.String(8))
+    url: so.Mapped[Optional[str]] = so.mapped_column(sa.String(255))
+    # ключ объекта, загружаемого клиентом напрямую в хранилище по подписанной ссылке
+    key: so.Mapped[Optional[str]] = so.mapped_column(sa.String(100))
+    created_at: so.Mapped[datetime] = so.mapped_column(index=True, default=lambda: datetime.now(timezone.utc))
@@ -2,7 +2,9 @@ from abc import ABC, abstractmethod
 import sqlalchemy as sa
 import sqlalchemy.orm as so
 from app import db
+from app.images import get_image_links
 from app.models import Post, User, likes
+from app.sync.repository import ChangeRepository
 from app.utils import paginate
 from flask import g, url_for
 from datetime import datetime
@@ -38,6 +40,10 @@ class PostRepositoryInterface(ABC):
     def update_image_url(self, post: Post, image_url: str) -> None:
         pass
 
+    @abstractmethod
+    def update_image_renditions(self, post: Post, renditions: dict) -> None:
+        pass
+
     @abstractmethod
     def is_liked(self, post: Post, user: User) -> bool:
         pass
@@ -70,11 +76,20 @@ class PostRepository(PostRepositoryInterface):
     def add(self, data: dict) -> Post:
         post: Post = Post(**data)
         db.session.add(post)
+        db.session.flush()
+        ChangeRepository().add([post.user_id], 'post', post.id, 'created')
         db.session.commit()
         return post
 
     def update_image_url(self, post: Post, image_url: str) -> None:
         post.image_url = image_url
+        post.image_renditions = None
+        ChangeRepository().add([post.user_id], 'post', post.id, 'updated')
+        db.session.commit()
+
+    def update_image_renditions(self, post: Post, renditions: dict) -> None:
+        post.image_renditions = renditions
+        ChangeRepository().add([post.user_id], 'post', post.id, 'updated')
         db.session.commit()
 
     def paginate_by_filters(
@@ -90,13 +105,16 @@ class PostRepository(PostRepositoryInterface):
         return query
 
     def delete(self, post: Post) -> None:
+        post_id, user_id = post.id, post.user_id
         db.session.delete(post)
+        ChangeRepository().add([user_id], 'post', post_id, 'deleted')
         db.session.commit()
 
     def update_model_from_dict(self, model: Post, data: dict):
         for field in ['hashtags', 'text']:
             if field in data:
                 setattr(model, field, data[field])
+        ChangeRepository().add([model.user_id], 'post', model.id, 'updated')
         db.session.commit()
 
     def is_liked(self, post: Post, user: User) -> bool:
@@ -105,10 +123,12 @@ class PostRepository(PostRepositoryInterface):
 
     def like_post(self, post: Post, user: User) -> None:
         post.liked_users.add(user)
+        ChangeRepository().add([user.id], 'like', post.id, 'created')
         db.session.commit()
 
     def unlike_post(self, post: Post, user: User) -> None:
         post.liked_users.remove(user)
+        ChangeRepository().add([user.id], 'like', post.id, 'deleted')
         db.session.commit()
 
     def likes_count(self, post: Post) -> int:
@@ -125,6 +145,7 @@ class PostRepository(PostRepositoryInterface):
         return result
 
     def model_to_dict(self, model: Post) -> dict:
+        image, srcset = get_image_links(model.image_url, model.image_renditions)
         data = {
             'id': model.id,
             'text': model.text,
@@ -136,7 +157,8 @@ class PostRepository(PostRepositoryInterface):
             'is_liked': self.is_liked(model, g.current_user),
             'links': {
                 'self': url_for('post', post_id=model.id),
-                'image': model.image_url
+                'image': image,
+                'srcset': srcset
             }
         }
         return data
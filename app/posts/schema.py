@@ -12,3 +12,4 @@ class PostSchema(Schema):
                                           "null": "Введите хэштеги", "invalid": "Проверьте хэштеги"})
     user_id = fields.Integer(error_messages={"invalid": "Проверьте автора"})
     community_id = fields.Integer(error_messages={"invalid": "Проверьте сообщество"})
+    upload_id = fields.UUID(error_messages={"invalid": "Проверьте загруженный файл"})
@@ -1,12 +1,10 @@
 import math
-import os
-import uuid
 from abc import ABC, abstractmethod
 from app.utils import get_similarity_vector
 
 import sqlalchemy as sa
-from flask import g, current_app as app, abort
-from werkzeug.utils import secure_filename
+from flask import g, abort
+from werkzeug.datastructures import FileStorage
 
 from app.models import Post, Community
 from app.models import User
@@ -15,6 +13,9 @@ from app.users.repository import UserRepositoryInterface
 from app.communities.repository import CommunityRepositoryInterface
 from datetime import datetime
 from app import db
+from app.storage import save_upload
+from app.tasks import process_image
+from app.uploads.repository import UploadRepositoryInterface
 
 FRIEND_LIKE_WEIGHT = 5
 AUTHOR_FRIEND_WEIGHT = 10
@@ -27,6 +28,7 @@ class PostServiceInterface(ABC):
     user_repository: UserRepositoryInterface
     post_repository: PostRepositoryInterface
     community_repository: CommunityRepositoryInterface
+    upload_repository: UploadRepositoryInterface
 
     @abstractmethod
     def get_post(self, post_id: int) -> dict:
@@ -51,7 +53,7 @@ class PostServiceInterface(ABC):
         pass
 
     @abstractmethod
-    def upload_image(self, post: Post, image) -> None:
+    def upload_image(self, post: Post, image: FileStorage | str) -> None:
         pass
 
     @abstractmethod
@@ -69,10 +71,12 @@ class PostServiceInterface(ABC):
 
 class PostService(PostServiceInterface):
     def __init__(self, post_repository: PostRepositoryInterface,
-                 user_repository: UserRepositoryInterface, community_repository: CommunityRepositoryInterface):
+                 user_repository: UserRepositoryInterface, community_repository: CommunityRepositoryInterface,
+                 upload_repository: UploadRepositoryInterface):
         self.post_repository = post_repository
         self.user_repository = user_repository
         self.community_repository = community_repository
+        self.upload_repository = upload_repository
 
     def add_post(self, data: dict) -> dict:
         author_id = data.get('user_id')
@@ -86,6 +90,9 @@ class PostService(PostServiceInterface):
         image = data.get("image")
         if image:
             del data["image"]
+        upload_id = data.pop("upload_id", None)
+        if upload_id:
+            image = self.upload_repository.get_url(upload_id, g.current_user)
         for key, value in data.items():
             if type(value) is str:
                 data[key] = value.strip()
@@ -103,6 +110,9 @@ class PostService(PostServiceInterface):
         image = data.get("image")
         if image:
             del data["image"]
+        upload_id = data.pop("upload_id", None)
+        if upload_id:
+            image = self.upload_repository.get_url(upload_id, g.current_user)
         for key, value in data.items():
             if type(value) is str:
                 data[key] = value.strip()
@@ -112,16 +122,11 @@ class PostService(PostServiceInterface):
             self.upload_image(post, image)
         return self.post_repository.model_to_dict(post)
 
-    def upload_image(self, post: Post, image) -> None:
-        filename = secure_filename(image.filename)
-        extension = filename.rsplit('.', 1)[1].lower()
-        filename = f'{str(uuid.uuid4())}.{extension}'
-        image_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        if not os.path.exists(app.config['UPLOAD_FOLDER']):
-            os.mkdir(app.config['UPLOAD_FOLDER'])
-        image.save(image_path)
-        image_url = f'/static/images/{filename}'
+    def upload_image(self, post: Post, image: FileStorage | str) -> None:
+        """Установка изображения из файла запроса или по ссылке на завершенную загрузку"""
+        image_url = save_upload(image) if isinstance(image, FileStorage) else image
         self.post_repository.update_image_url(post, image_url)
+        process_image.delay('post', post.id, image_url)
 
     def get_posts(
             self, author_name: str | None, community_id: int | None,
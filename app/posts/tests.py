@@ -1,12 +1,21 @@
+import hashlib
+import io
+import os
+import tempfile
 from unittest import TestCase, main
 
 from flask import g
+from PIL import Image
+from werkzeug.datastructures import FileStorage
 
 from app import create_app, db
 from app.communities.repository import CommunityRepository
 from app.models import Post, User, Community
 from app.posts.repository import PostRepository
 from app.posts.service import PostService
+from app.storage import save_upload
+from app.tasks import process_image
+from app.uploads.repository import UploadRepository
 from app.users.repository import UserRepository
 from config import TestConfig
 
@@ -15,7 +24,7 @@ class PostModelCase(TestCase):
     def setUp(self):
         self.app = create_app(TestConfig)
         self.app_context = self.app.app_context()
-        self.service = PostService(PostRepository(), UserRepository(), CommunityRepository())
+        self.service = PostService(PostRepository(), UserRepository(), CommunityRepository(), UploadRepository())
         self.app_context.push()
         db.create_all()
 
@@ -194,6 +203,40 @@ class PostModelCase(TestCase):
             self.assertEqual(len(result["items"]), 3)
             self.assertEqual(result["items"][0]["text"], "тестирование публикации")
 
+    def test_process_image(self):
+        with self.app.app_context(), self.app.test_request_context(), tempfile.TemporaryDirectory() as folder:
+            self.app.config['UPLOAD_FOLDER'] = folder
+            user: User = User(username="ivan", email="ivan@example.com", firstname="Иван", lastname="Петров")
+            post: Post = Post(hashtags="новости", text="тестирование публикации", image_url="/static/images/test.jpg")
+            post.author = user
+            db.session.add_all([user, post])
+            db.session.commit()
+            exif = Image.Exif()
+            exif[0x010F] = "camera"
+            Image.new("RGB", (2000, 1000), "red").save(os.path.join(folder, "test.jpg"), exif=exif)
+            g.current_user = user
+            self.assertIsNone(PostRepository().model_to_dict(post)["links"]["srcset"])
+            process_image("post", post.id, "/static/images/test.jpg")
+            db.session.refresh(post)
+            self.assertEqual(post.image_renditions["thumb"]["width"], 160)
+            self.assertEqual(post.image_renditions["full"]["height"], 800)
+            with Image.open(os.path.join(folder, "test_full.jpg")) as image:
+                self.assertEqual(len(image.getexif()), 0)
+            links: dict = PostRepository().model_to_dict(post)["links"]
+            self.assertEqual(links["image"], "/static/images/test_full.jpg")
+            self.assertTrue(links["srcset"]["webp"].startswith("/static/images/test_thumb.webp 160w"))
+
+    def test_save_upload(self):
+        with tempfile.TemporaryDirectory() as folder:
+            self.app.config['UPLOAD_FOLDER'] = folder
+            name = hashlib.sha256(b"image").hexdigest()
+            url = save_upload(FileStorage(io.BytesIO(b"image"), "photo.JPG"))
+            self.assertEqual(url, f"/static/images/{name[:2]}/{name}.jpg")
+            self.assertTrue(os.path.exists(os.path.join(folder, name[:2], f"{name}.jpg")))
+            self.assertEqual(save_upload(FileStorage(io.BytesIO(b"image"), "copy.jpg")), url)
+            self.assertEqual(os.listdir(os.path.join(folder, name[:2])), [f"{name}.jpg"])
+            self.assertEqual(len(os.listdir(folder)), 1)
+
 
 if __name__ == '__main__':
     main(verbosity=2)
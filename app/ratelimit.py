@@ -0,0 +1,107 @@
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from functools import wraps
+
+from flask import current_app as app, request, abort, g
+
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local retry_after = 0
+if tokens < 1 then
+    retry_after = (1 - tokens) / rate
+else
+    tokens = tokens - 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate))
+return tostring(retry_after)
+"""
+
+
+class RateLimiterInterface(ABC):
+    @abstractmethod
+    def acquire(self, key: str, capacity: int, period: int) -> float:
+        """Забирает жетон из корзины, возвращает 0 или время ожидания в секундах"""
+        pass
+
+
+class RedisRateLimiter(RateLimiterInterface):
+    """Корзина жетонов в Redis, проверка и списание выполняются атомарно скриптом Lua"""
+
+    def __init__(self):
+        self.script = app.extensions['redis'].register_script(TOKEN_BUCKET_SCRIPT)
+
+    def acquire(self, key: str, capacity: int, period: int) -> float:
+        return float(self.script(keys=[key], args=[capacity, capacity / period]))
+
+
+class MemoryRateLimiter(RateLimiterInterface):
+    """Корзина жетонов в памяти процесса"""
+
+    def __init__(self):
+        self.buckets: dict[str, tuple[float, float]] = {}
+        self.lock = threading.Lock()
+
+    def acquire(self, key: str, capacity: int, period: int) -> float:
+        rate = capacity / period
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated = self.buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            if tokens < 1:
+                self.buckets[key] = (tokens, now)
+                return (1 - tokens) / rate
+            self.buckets[key] = (tokens - 1, now)
+            return 0
+
+
+def get_rate_limiter() -> RateLimiterInterface:
+    if 'rate_limiter' not in app.extensions:
+        limiters = {'redis': RedisRateLimiter, 'memory': MemoryRateLimiter}
+        app.extensions['rate_limiter'] = limiters[app.config['RATELIMIT_BACKEND']]()
+    return app.extensions['rate_limiter']
+
+
+def get_client_keys() -> dict[str, str]:
+    """Ключи ограничения: IP-адрес клиента и пользователь (текущий или указанный в запросе)"""
+    keys = {'ip': request.headers.get("x-real-ip", request.remote_addr)}
+    user = g.get('current_user')
+    if user is not None:
+        keys['user'] = str(user.id)
+    else:
+        data = request.get_json(silent=True)
+        login = (data.get('username') or data.get('email')) if isinstance(data, dict) else None
+        if isinstance(login, str) and login:
+            keys['user'] = login.strip().lower()
+    return keys
+
+
+def rate_limit(name: str):
+    """Ограничение частоты запросов к обработчику по лимиту RATELIMITS[name]"""
+
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            if app.config['RATELIMIT_ENABLED']:
+                capacity, period = app.config['RATELIMITS'][name]
+                limiter = get_rate_limiter()
+                retry_after = max(
+                    limiter.acquire(f'ratelimit:{name}:{request.method}:{scope}:{value}', capacity, period)
+                    for scope, value in get_client_keys().items()
+                )
+                if retry_after:
+                    abort(429, retry_after=math.ceil(retry_after))
+            return f(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,107 @@
+import queue
+import smtplib
+import time
+from contextlib import contextmanager
+
+from flask import current_app as app
+from flask_mail import Connection, Message
+
+from app import mail
+
+
+class DeliveryError(Exception):
+    """Временная ошибка SMTP, sent - число писем, отправленных до ошибки"""
+
+    def __init__(self, sent: int, error: Exception):
+        super().__init__(str(error))
+        self.sent = sent
+        self.error = error
+
+
+def is_transient(error: Exception) -> bool:
+    """Ошибки соединения и ответы 4xx сервера, после которых отправку можно повторить"""
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500 or isinstance(error, smtplib.SMTPConnectError)
+    return isinstance(error, (smtplib.SMTPServerDisconnected, OSError))
+
+
+class SMTPPool:
+    """Постоянные SMTP-соединения процесса, переиспользуемые между задачами"""
+
+    def __init__(self, size: int, keepalive: int):
+        self.size = size
+        self.keepalive = keepalive
+        self.idle: queue.LifoQueue[tuple[Connection, float]] = queue.LifoQueue()
+
+    def open(self) -> Connection:
+        return mail.connect().__enter__()
+
+    def close(self, connection: Connection) -> None:
+        try:
+            connection.__exit__(None, None, None)
+        except (smtplib.SMTPException, OSError):
+            pass
+
+    def acquire(self) -> Connection:
+        while True:
+            try:
+                connection, released = self.idle.get_nowait()
+            except queue.Empty:
+                return self.open()
+            if connection.host is None or time.monotonic() - released < self.keepalive:
+                return connection
+            # долго простаивавшее соединение могло быть закрыто сервером
+            try:
+                if connection.host.noop()[0] == 250:
+                    return connection
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.close(connection)
+
+    def release(self, connection: Connection) -> None:
+        if self.idle.qsize() < self.size:
+            self.idle.put((connection, time.monotonic()))
+        else:
+            self.close(connection)
+
+    @contextmanager
+    def connection(self):
+        connection = self.acquire()
+        try:
+            yield connection
+        except BaseException:
+            self.close(connection)
+            raise
+        self.release(connection)
+
+
+def get_smtp_pool() -> SMTPPool:
+    if 'smtp_pool' not in app.extensions:
+        app.extensions['smtp_pool'] = SMTPPool(app.config['MAIL_POOL_SIZE'], app.config['MAIL_KEEPALIVE'])
+    return app.extensions['smtp_pool']
+
+
+def make_message(subject: str, sender: str | tuple[str, str], recipients: list[str | tuple[str, str]],
+                 text_body: str, html_body: str, attachments=None) -> Message:
+    msg = Message(subject, recipients, text_body, html_body, sender=sender)
+    if attachments:
+        for attachment in attachments:
+            msg.attach(*attachment)
+    return msg
+
+
+def deliver(messages: list[Message]) -> None:
+    """Отправка писем через одно соединение пула, письма с отклоненными адресатами пропускаются"""
+    sent = 0
+    try:
+        with get_smtp_pool().connection() as connection:
+            for msg in messages:
+                try:
+                    connection.send(msg)
+                except smtplib.SMTPRecipientsRefused as e:
+                    app.logger.warning('Адресаты письма отклонены: %s', e.recipients)
+                sent += 1
+    except (smtplib.SMTPException, OSError) as e:
+        if not is_transient(e):
+            raise
+        raise DeliveryError(sent, e) from e
@@ -0,0 +1,265 @@
+import hashlib
+import mimetypes
+import os
+import shutil
+import tempfile
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import BinaryIO, Iterator
+
+from flask import current_app as app
+from werkzeug.datastructures import FileStorage
+from werkzeug.utils import secure_filename
+
+STATIC_URL = '/static/images/'
+CHUNK_SIZE = 64 * 1024
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+def content_type(key: str) -> str:
+    """Тип содержимого по расширению ключа, S3 отдает объект с этим заголовком"""
+    return mimetypes.guess_type(key)[0] or 'application/octet-stream'
+
+
+def make_key(digest: str, extension: str) -> str:
+    """Ключ объекта по хешу содержимого: <первые два символа>/<sha256>.<расширение>"""
+    return f'{digest[:2]}/{digest}.{extension}'
+
+
+class HashingReader:
+    """Обертка над потоком, считающая SHA-256 по мере чтения"""
+
+    def __init__(self, stream: BinaryIO):
+        self.stream = stream
+        self.digest = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self.stream.read(size)
+        self.digest.update(chunk)
+        return chunk
+
+
+class ConcatReader:
+    """Последовательное чтение нескольких объектов хранилища как одного потока"""
+
+    def __init__(self, storage: 'StorageInterface', keys: list[str]):
+        self.storage = storage
+        self.keys = iter(keys)
+        self.current: BinaryIO | None = None
+
+    def read(self, size: int = -1) -> bytes:
+        while True:
+            if self.current is None:
+                key = next(self.keys, None)
+                if key is None:
+                    return b''
+                self.current = self.storage.open(key)
+            chunk = self.current.read(size)
+            if chunk:
+                return chunk
+            self.current.close()
+            self.current = None
+
+
+class StorageInterface(ABC):
+    @abstractmethod
+    def save(self, stream: BinaryIO, extension: str) -> str:
+        """Потоковая запись с дедупликацией по хешу содержимого, возвращает ключ"""
+        pass
+
+    @abstractmethod
+    def write(self, key: str, stream: BinaryIO) -> None:
+        pass
+
+    @abstractmethod
+    def open(self, key: str) -> BinaryIO:
+        pass
+
+    @abstractmethod
+    def touch(self, key: str) -> None:
+        """Обновление времени изменения, чтобы повторно используемый файл не удалила очистка хранилища"""
+        pass
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        pass
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        pass
+
+    @abstractmethod
+    def list(self) -> Iterator[tuple[str, int, datetime]]:
+        """Ключ, размер и время изменения всех объектов"""
+        pass
+
+    @abstractmethod
+    def url(self, key: str) -> str:
+        pass
+
+    @abstractmethod
+    def key(self, url: str) -> str | None:
+        """Ключ по ссылке или None, если ссылка указывает не на это хранилище"""
+        pass
+
+    @abstractmethod
+    def presign_upload(self, digest: str, extension: str, content_type: str, length: int) -> dict | None:
+        """Подписанный запрос для загрузки клиентом напрямую в хранилище, None - не поддерживается"""
+        pass
+
+
+class FileSystemStorage(StorageInterface):
+    """Локальный каталог UPLOAD_FOLDER, файлы раздаются как статика"""
+
+    def __init__(self, folder: str, base_url: str = STATIC_URL):
+        self.folder = folder
+        self.base_url = base_url
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.folder, *key.split('/'))
+
+    def save(self, stream: BinaryIO, extension: str) -> str:
+        os.makedirs(self.folder, exist_ok=True)
+        reader = HashingReader(stream)
+        # хеш считается во время записи, файл не читается повторно
+        with tempfile.NamedTemporaryFile(dir=self.folder, suffix='.part', delete=False) as temp:
+            shutil.copyfileobj(reader, temp, CHUNK_SIZE)
+        key = make_key(reader.digest.hexdigest(), extension)
+        if self.exists(key):
+            os.remove(temp.name)
+            self.touch(key)
+        else:
+            os.makedirs(os.path.dirname(self.path(key)), exist_ok=True)
+            os.replace(temp.name, self.path(key))
+        return key
+
+    def write(self, key: str, stream: BinaryIO) -> None:
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), suffix='.part', delete=False) as temp:
+            shutil.copyfileobj(stream, temp, CHUNK_SIZE)
+        os.replace(temp.name, path)
+
+    def open(self, key: str) -> BinaryIO:
+        return open(self.path(key), 'rb')
+
+    def touch(self, key: str) -> None:
+        os.utime(self.path(key))
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self.path(key))
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def list(self) -> Iterator[tuple[str, int, datetime]]:
+        for root, _, files in os.walk(self.folder):
+            for name in files:
+                stat = os.stat(os.path.join(root, name))
+                key = os.path.relpath(os.path.join(root, name), self.folder).replace(os.sep, '/')
+                yield key, stat.st_size, datetime.fromtimestamp(stat.st_mtime, timezone.utc)
+
+    def url(self, key: str) -> str:
+        return f'{self.base_url}{key}'
+
+    def key(self, url: str) -> str | None:
+        return url.removeprefix(self.base_url) if url.startswith(self.base_url) else None
+
+    def presign_upload(self, digest: str, extension: str, content_type: str, length: int) -> dict | None:
+        return None
+
+
+class S3Storage(StorageInterface):
+    """S3-совместимое хранилище (AWS S3, MinIO), объекты раздаются по S3_PUBLIC_URL"""
+
+    def __init__(self, bucket: str, public_url: str, presign_expires: int, **options):
+        # boto3 загружается долго, поэтому импортируется только при выборе этого хранилища
+        import boto3
+        self.client = boto3.client('s3', **options)
+        self.bucket = bucket
+        self.public_url = public_url.rstrip('/') + '/'
+        self.presign_expires = presign_expires
+
+    def save(self, stream: BinaryIO, extension: str) -> str:
+        reader = HashingReader(stream)
+        temp_key = f'tmp/{uuid.uuid4()}'
+        # upload_fileobj разбивает большие файлы на части (multipart upload), поток не буферизуется целиком
+        self.client.upload_fileobj(reader, self.bucket, temp_key,
+                                   ExtraArgs={'ContentType': content_type(f'file.{extension}')})
+        key = make_key(reader.digest.hexdigest(), extension)
+        try:
+            # копирование поверх существующего объекта с тем же содержимым обновляет время его изменения,
+            # при замене метаданных тип содержимого задается заново, иначе он сбрасывается
+            self.client.copy_object(Bucket=self.bucket, Key=key, CopySource={'Bucket': self.bucket, 'Key': temp_key},
+                                    CacheControl=IMMUTABLE, ContentType=content_type(key), MetadataDirective='REPLACE')
+        finally:
+            self.client.delete_object(Bucket=self.bucket, Key=temp_key)
+        return key
+
+    def write(self, key: str, stream: BinaryIO) -> None:
+        self.client.upload_fileobj(stream, self.bucket, key,
+                                   ExtraArgs={'CacheControl': IMMUTABLE, 'ContentType': content_type(key)})
+
+    def open(self, key: str) -> BinaryIO:
+        return self.client.get_object(Bucket=self.bucket, Key=key)['Body']
+
+    def touch(self, key: str) -> None:
+        self.client.copy_object(Bucket=self.bucket, Key=key, CopySource={'Bucket': self.bucket, 'Key': key},
+                                CacheControl=IMMUTABLE, ContentType=content_type(key), MetadataDirective='REPLACE')
+
+    def exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey'):
+                return False
+            raise
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    def list(self) -> Iterator[tuple[str, int, datetime]]:
+        for page in self.client.get_paginator('list_objects_v2').paginate(Bucket=self.bucket):
+            for item in page.get('Contents', []):
+                yield item['Key'], item['Size'], item['LastModified']
+
+    def url(self, key: str) -> str:
+        return f'{self.public_url}{key}'
+
+    def key(self, url: str) -> str | None:
+        return url.removeprefix(self.public_url) if url.startswith(self.public_url) else None
+
+    def presign_upload(self, digest: str, extension: str, content_type: str, length: int) -> dict | None:
+        key = make_key(digest, extension)
+        # в отличие от PUT, политика POST ограничивает размер и фиксирует тип содержимого
+        post = self.client.generate_presigned_post(
+            self.bucket, key, ExpiresIn=self.presign_expires,
+            Fields={'Content-Type': content_type, 'Cache-Control': IMMUTABLE},
+            Conditions=[{'Content-Type': content_type}, {'Cache-Control': IMMUTABLE},
+                        ['content-length-range', length, length]])
+        return {'method': 'POST', 'url': post['url'], 'fields': post['fields'], 'key': key}
+
+
+def get_storage() -> StorageInterface:
+    if 'storage' not in app.extensions:
+        if app.config['STORAGE_BACKEND'] == 's3':
+            app.extensions['storage'] = S3Storage(
+                app.config['S3_BUCKET'], app.config['S3_PUBLIC_URL'], app.config['S3_PRESIGN_EXPIRES'],
+                endpoint_url=app.config['S3_ENDPOINT_URL'], region_name=app.config['S3_REGION'],
+                aws_access_key_id=app.config['S3_ACCESS_KEY'], aws_secret_access_key=app.config['S3_SECRET_KEY'])
+        else:
+            app.extensions['storage'] = FileSystemStorage(app.config['UPLOAD_FOLDER'])
+    return app.extensions['storage']
+
+
+def save_upload(file: FileStorage) -> str:
+    """Сохранение загруженного файла в хранилище, возвращает постоянную ссылку"""
+    extension = secure_filename(file.filename).rsplit('.', 1)[1].lower()
+    storage = get_storage()
+    return storage.url(storage.save(file.stream, extension))
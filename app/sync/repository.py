@@ -0,0 +1,101 @@
+from abc import ABC, abstractmethod
+from datetime import datetime
+
+import sqlalchemy as sa
+
+from app import db
+from app.models import Change, User, friends
+
+
+def as_bigint(xid: sa.ColumnElement) -> sa.ColumnElement:
+    """Номер транзакции PostgreSQL (xid8) как число"""
+    return sa.cast(sa.cast(xid, sa.Text), sa.BigInteger)
+
+
+class ChangeRepositoryInterface(ABC):
+    @abstractmethod
+    def add(self, user_ids: list[int], entity: str, entity_id: int, action: str) -> None:
+        pass
+
+    @abstractmethod
+    def add_many(self, changes: list[dict]) -> None:
+        pass
+
+    @abstractmethod
+    def get_changes(self, user: User, since: int, limit: int) -> list[Change]:
+        pass
+
+    @abstractmethod
+    def get_cursor(self) -> int:
+        pass
+
+    @abstractmethod
+    def has_cursor(self, since: int) -> bool:
+        """Записи после курсора не удалены очисткой журнала"""
+        pass
+
+    @abstractmethod
+    def delete_before(self, date: datetime, batch_size: int, max_batches: int) -> int:
+        pass
+
+
+class ChangeRepository(ChangeRepositoryInterface):
+    def add(self, user_ids: list[int], entity: str, entity_id: int, action: str) -> None:
+        """Запись изменения без фиксации транзакции, фиксируется вместе с самим изменением"""
+        self.add_many([{'user_id': user_id, 'entity': entity, 'entity_id': entity_id, 'action': action}
+                       for user_id in user_ids if user_id is not None])
+
+    def add_many(self, changes: list[dict]) -> None:
+        if changes:
+            insert = sa.insert(Change)
+            if db.engine.dialect.name == 'postgresql':
+                # номер транзакции позволяет читателю не пропустить записи транзакций, зафиксированных позже
+                insert = insert.values(xid=as_bigint(sa.func.pg_current_xact_id()))
+            db.session.execute(insert, changes)
+
+    @staticmethod
+    def committed() -> list[sa.ColumnElement]:
+        """Условие на записи, раньше которых в журнале уже не появятся новые"""
+        if db.engine.dialect.name == 'postgresql':
+            # транзакции с номером меньше xmin снимка завершены, более поздние могут еще добавить записи
+            return [Change.xid < as_bigint(sa.func.pg_snapshot_xmin(sa.func.pg_current_snapshot()))]
+        # SQLite выполняет пишущие транзакции по очереди, идентификаторы возрастают в порядке фиксации
+        return []
+
+    def get_changes(self, user: User, since: int, limit: int) -> list[Change]:
+        following = sa.select(friends.c.friend_id).where(friends.c.user_id == user.id)
+        query = (sa.select(Change)
+                 .where(*self.committed(),
+                        sa.or_(Change.user_id == user.id,
+                               sa.and_(Change.entity == 'post', Change.user_id.in_(following))))
+                 .order_by(Change.xid, Change.id)
+                 .limit(limit))
+        if since:
+            # записи упорядочены по транзакции, затем по идентификатору, курсор - последняя прочитанная запись
+            xid = sa.select(Change.xid).where(Change.id == since).scalar_subquery()
+            query = query.where(sa.tuple_(Change.xid, Change.id) > sa.tuple_(xid, since))
+        return db.session.scalars(query).all()
+
+    def get_cursor(self) -> int:
+        return db.session.scalar(sa.select(Change.id).where(*self.committed())
+                                 .order_by(Change.xid.desc(), Change.id.desc()).limit(1)) or 0
+
+    def has_cursor(self, since: int) -> bool:
+        if since == 0:
+            # журнал читается с начала, если из него ничего не удалялось
+            return (db.session.scalar(sa.select(sa.func.min(Change.id))) or 1) == 1
+        return db.session.scalar(sa.select(Change.id).where(Change.id == since)) is not None
+
+    def delete_before(self, date: datetime, batch_size: int, max_batches: int) -> int:
+        """Удаление старых записей пакетами, последняя запись сохраняется как курсор для новых клиентов"""
+        removed = 0
+        last = self.get_cursor()
+        for _ in range(max_batches):
+            batch = (sa.select(Change.id).where(Change.date < date, Change.id != last)
+                     .order_by(Change.id).limit(batch_size))
+            result = db.session.execute(sa.delete(Change).where(Change.id.in_(batch)))
+            db.session.commit()
+            removed += result.rowcount
+            if result.rowcount < batch_size:
+                break
+        return removed
@@ -0,0 +1,45 @@
+from abc import ABC, abstractmethod
+
+from flask import g, abort, current_app as app
+
+from app.models import Change
+from app.sync.repository import ChangeRepositoryInterface
+
+ENTITIES = ('message', 'post', 'like', 'follow')
+
+
+class SyncServiceInterface(ABC):
+    change_repository: ChangeRepositoryInterface
+
+    @abstractmethod
+    def get_changes(self, since: int | None) -> dict:
+        pass
+
+
+class SyncService(SyncServiceInterface):
+    def __init__(self, change_repository: ChangeRepositoryInterface):
+        self.change_repository = change_repository
+
+    def get_changes(self, since: int | None) -> dict:
+        """Изменения после курсора since, сгруппированные по сущностям и действиям"""
+        changes = {entity: {'created': [], 'updated': [], 'deleted': []} for entity in ENTITIES}
+        if since is None:
+            return {'changes': changes, 'cursor': self.change_repository.get_cursor(), 'has_more': False}
+        if not self.change_repository.has_cursor(since):
+            abort(410, 'Журнал изменений очищен, требуется полная синхронизация')
+        limit = app.config['SYNC_LIMIT']
+        rows: list[Change] = self.change_repository.get_changes(g.current_user, since, limit)
+        actions: dict[tuple[str, int], str] = {}
+        for change in rows:
+            key = (change.entity, change.entity_id)
+            # созданная и затем измененная запись для клиента остается новой
+            if not (actions.get(key) == 'created' and change.action == 'updated'):
+                actions.pop(key, None)
+                actions[key] = change.action
+        for (entity, entity_id), action in actions.items():
+            changes[entity][action].append(entity_id)
+        return {
+            'changes': changes,
+            'cursor': rows[-1].id if rows else since,
+            'has_more': len(rows) == limit,
+        }
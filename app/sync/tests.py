@@ -0,0 +1,153 @@
+import os
+import tempfile
+import threading
+from datetime import datetime
+from unittest import TestCase, main
+
+from flask import g
+from werkzeug.exceptions import Gone
+
+from app import create_app, create_worker_app, db
+from app.communities.repository import CommunityRepository
+from app.messages.repository import MessageRepository, ConversationRepository
+from app.models import Change, Community, Post, User
+from app.posts.repository import PostRepository
+from app.sync.repository import ChangeRepository
+from app.sync.service import SyncService
+from app.users.repository import UserRepository
+from config import TestConfig
+
+
+class SyncModelCase(TestCase):
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        self.app_context = self.app.app_context()
+        self.service = SyncService(ChangeRepository())
+        self.app_context.push()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_get_changes(self):
+        with self.app.app_context(), self.app.test_request_context():
+            user1: User = User(username="ivan", email="ivan@example.com", firstname="Иван", lastname="Петров")
+            user2: User = User(username="petr", email="petr@example.com", firstname="Петр", lastname="Иванов")
+            user3: User = User(username="alex", email="alex@example.com", firstname="Алексей", lastname="Иванов")
+            db.session.add_all([user1, user2, user3])
+            db.session.commit()
+            g.current_user = user1
+            cursor = self.service.get_changes(None)["cursor"]
+            user_repository, post_repository = UserRepository(), PostRepository()
+            user_repository.follow(user1, user2)
+            user_repository.follow(user2, user1)
+            post1 = post_repository.add({"text": "Публикация", "hashtags": "", "user_id": user2.id})
+            post2 = post_repository.add({"text": "Публикация", "hashtags": "", "user_id": user3.id})
+            post_repository.update_model_from_dict(post1, {"text": "Новый текст"})
+            post_repository.like_post(post2, user1)
+            post_repository.delete(post2)
+            message = MessageRepository(ConversationRepository()).add(
+                {"body": "Привет", "sender_id": user2.id, "recipient_id": user1.id})
+            result: dict = self.service.get_changes(cursor)
+            self.assertEqual(result["changes"]["follow"]["created"], [user2.id])
+            self.assertEqual(result["changes"]["post"]["created"], [post1.id])
+            self.assertEqual(result["changes"]["post"]["deleted"], [])
+            self.assertEqual(result["changes"]["like"]["created"], [post2.id])
+            self.assertEqual(result["changes"]["message"]["created"], [message.id])
+            self.assertFalse(result["has_more"])
+            result = self.service.get_changes(result["cursor"])
+            self.assertEqual(result["changes"]["post"]["created"], [])
+            user_repository.unfollow(user2, user1)
+            self.assertEqual(self.service.get_changes(result["cursor"])["changes"]["follow"]["deleted"], [])
+            user_repository.unfollow(user1, user2)
+            result = self.service.get_changes(result["cursor"])
+            self.assertEqual(result["changes"]["follow"]["deleted"], [user2.id])
+            ChangeRepository().delete_before(datetime.max, 100, 1)
+            with self.assertRaises(Gone):
+                self.service.get_changes(cursor)
+
+    def test_delete_community_posts(self):
+        with self.app.app_context(), self.app.test_request_context():
+            user1: User = User(username="ivan", email="ivan@example.com", firstname="Иван", lastname="Петров")
+            user2: User = User(username="petr", email="petr@example.com", firstname="Петр", lastname="Иванов")
+            user1.following.add(user2)
+            community: Community = Community(name="сообщество программистов", description="создаем приложения")
+            community.owner = user2
+            post: Post = Post(hashtags="новости", text="публикация сообщества", author=user2, community=community)
+            db.session.add_all([user1, user2, community, post])
+            db.session.commit()
+            g.current_user = user1
+            cursor = self.service.get_changes(None)["cursor"]
+            CommunityRepository().delete(community)
+            result: dict = self.service.get_changes(cursor)
+            self.assertEqual(result["changes"]["post"]["deleted"], [post.id])
+
+    def test_transaction_ordered_cursor(self):
+        with self.app.app_context(), self.app.test_request_context():
+            user: User = User(username="ivan", email="ivan@example.com", firstname="Иван", lastname="Петров")
+            db.session.add(user)
+            db.session.commit()
+            db.session.add(Change(id=1, user_id=user.id, entity="post", entity_id=1, action="created"))
+            db.session.commit()
+            g.current_user = user
+            cursor = self.service.get_changes(None)["cursor"]
+            db.session.add(Change(id=11, xid=100, user_id=user.id, entity="post", entity_id=3, action="created"))
+            db.session.commit()
+            result: dict = self.service.get_changes(cursor)
+            self.assertEqual(result["changes"]["post"]["created"], [3])
+            # идентификатор выделен раньше, но транзакция началась и зафиксирована позже прочитанной
+            db.session.add(Change(id=10, xid=200, user_id=user.id, entity="post", entity_id=2, action="created"))
+            db.session.commit()
+            result = self.service.get_changes(result["cursor"])
+            self.assertEqual(result["changes"]["post"]["created"], [2])
+            self.assertEqual(result["cursor"], 10)
+
+    def test_commit_ordered_cursor(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+
+        class FileConfig(TestConfig):
+            SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(folder.name, 'sync.db')}"
+
+        app = create_worker_app(FileConfig)
+        with app.app_context():
+            db.create_all()
+            user: User = User(username="ivan", email="ivan@example.com", firstname="Иван", lastname="Петров")
+            db.session.add(user)
+            db.session.commit()
+            user_id = user.id
+            cursor = ChangeRepository().get_cursor()
+        allocated, read = threading.Event(), threading.Event()
+
+        def write(entity_id: int, wait: bool):
+            with app.app_context():
+                ChangeRepository().add([user_id], 'post', entity_id, 'created')
+                if wait:
+                    allocated.set()
+                    read.wait(5)
+                db.session.commit()
+                db.session.remove()
+
+        # первая транзакция добавила запись, вторая ждет блокировку записи SQLite, клиент читает журнал между ними
+        slow = threading.Thread(target=write, args=(1, True))
+        slow.start()
+        allocated.wait(5)
+        fast = threading.Thread(target=write, args=(2, False))
+        fast.start()
+        with app.app_context():
+            user = db.session.get(User, user_id)
+            self.assertEqual(ChangeRepository().get_changes(user, cursor, 10), [])
+            read.set()
+            slow.join()
+            fast.join()
+            changes = ChangeRepository().get_changes(user, cursor, 10)
+            self.assertEqual([change.entity_id for change in changes], [1, 2])
+            self.assertTrue(all(change.id > cursor for change in changes))
+            db.session.remove()
+            db.drop_all()
+
+
+if __name__ == '__main__':
+    main(verbosity=2)
@@ -0,0 +1,19 @@
+from flask import request
+from flask.views import MethodView
+
+from app.auth import token_auth
+from app.sync.service import SyncServiceInterface
+
+
+class SyncAPI(MethodView):
+    init_every_request = False
+    decorators = [token_auth.login_required]
+
+    service: SyncServiceInterface
+
+    def __init__(self, service: SyncServiceInterface):
+        self.service = service
+
+    def get(self):
+        """Получение изменений после курсора"""
+        return self.service.get_changes(request.args.get('since', type=int))
@@ -1,14 +1,118 @@
+from datetime import datetime, timezone, timedelta
+
 from celery import shared_task
-from flask_mail import Message
+from flask import current_app as app, render_template
+
+from app import db
+from app.auth.repository import SessionRepository
+from app.communities.repository import CommunityRepository
+from app.images import make_renditions
+from app.media.repository import MediaRepository
+from app.metrics import sessions_reaped, sessions_reaped_per_run, media_files_collected, media_bytes_reclaimed
+from app.models import User, Post, Community
+from app.posts.repository import PostRepository
+from app.smtp import DeliveryError, deliver, make_message
+from app.storage import get_storage
+from app.sync.repository import ChangeRepository
+from app.uploads.repository import UploadRepository
+from app.users.repository import UserRepository
+
+# темы писем по имени шаблона в каталоге templates/email
+EMAIL_SUBJECTS = {
+    'reset_password': 'Сброс пароля',
+    'verify_email': 'Подтверждение электронной почты',
+    'two_factor': 'Код авторизации',
+}
+
+
+def retry_countdown(task) -> int:
+    """Экспоненциальная задержка перед повторной отправкой"""
+    return min(app.config['MAIL_RETRY_BACKOFF'] * 2 ** task.request.retries, app.config['MAIL_RETRY_BACKOFF_MAX'])
+
+
+@shared_task(bind=True, ignore_result=True, max_retries=3)
+def send_email(self, subject: str, sender: str | tuple[str, str], recipients: list[str | tuple[str, str]],
+               text_body: str, html_body: str, attachments=None):
+    try:
+        deliver([make_message(subject, sender, recipients, text_body, html_body, attachments)])
+    except DeliveryError as e:
+        raise self.retry(exc=e.error, countdown=retry_countdown(self))
+
+
+@shared_task(bind=True, ignore_result=True, max_retries=3)
+def send_user_email(self, template: str, user_id: int, **context):
+    """Письмо пользователю по шаблону, текст формируется в обработчике задач, а не в запросе"""
+    user = db.session.get(User, user_id)
+    if user is None:
+        return
+    try:
+        deliver([make_message(EMAIL_SUBJECTS[template], app.config['ADMINS'][0], [user.email],
+                              render_template(f'email/{template}.txt', user=user, **context),
+                              render_template(f'email/{template}.html', user=user, **context))])
+    except DeliveryError as e:
+        raise self.retry(exc=e.error, countdown=retry_countdown(self))
+
+
+@shared_task(ignore_result=True)
+def flush_last_seen():
+    UserRepository().flush_last_seen()
+
+
+@shared_task(ignore_result=True)
+def reap_expired_sessions():
+    removed = SessionRepository().delete_expired(app.config['SESSION_REAPER_BATCH_SIZE'],
+                                                 app.config['SESSION_REAPER_MAX_BATCHES'])
+    sessions_reaped.inc(removed)
+    sessions_reaped_per_run.observe(removed)
+    app.logger.info('Удалено истекших сеансов: %d', removed)
+
+
+@shared_task(ignore_result=True)
+def prune_change_log():
+    date = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=app.config['SYNC_RETENTION'])
+    removed = ChangeRepository().delete_before(date, app.config['SYNC_PRUNE_BATCH_SIZE'],
+                                               app.config['SYNC_PRUNE_MAX_BATCHES'])
+    app.logger.info('Удалено записей журнала изменений: %d', removed)
+
 
-from app import mail
+@shared_task(ignore_result=True)
+def process_image(entity: str, entity_id: int, image_url: str):
+    if entity == 'user':
+        model = db.session.get(User, entity_id)
+        if model is not None and model.avatar_url == image_url:
+            UserRepository().update_avatar_renditions(model, make_renditions(image_url))
+    elif entity == 'post':
+        model = db.session.get(Post, entity_id)
+        if model is not None and model.image_url == image_url:
+            PostRepository().update_image_renditions(model, make_renditions(image_url))
+    elif entity == 'community':
+        model = db.session.get(Community, entity_id)
+        if model is not None and model.image_url == image_url:
+            CommunityRepository().update_image_renditions(model, make_renditions(image_url))
 
 
-@shared_task(ignore_result=True, max_retries=3)
-def send_email(subject: str, sender: str | tuple[str, str], recipients: list[str | tuple[str, str]], text_body: str,
-               html_body: str, attachments=None):
-    msg = Message(subject, recipients, text_body, html_body, sender=sender)
-    if attachments:
-        for attachment in attachments:
-            msg.attach(*attachment)
-    mail.send(msg)
+@shared_task(ignore_result=True)
+def collect_media_garbage(dry_run: bool | None = None) -> dict:
+    if dry_run is None:
+        dry_run = app.config['MEDIA_GC_DRY_RUN']
+    storage = get_storage()
+    # время отсечения фиксируется до чтения ссылок: файл, загруженный позже, не попадет под удаление
+    deadline = datetime.now(timezone.utc) - timedelta(seconds=app.config['MEDIA_GC_GRACE'])
+    urls = MediaRepository().get_referenced_urls(app.config['MEDIA_GC_BATCH_SIZE'])
+    referenced = {storage.key(url) for url in urls}
+    files, reclaimed = 0, 0
+    for key, size, modified in storage.list():
+        if key in referenced or modified > deadline:
+            continue
+        if not dry_run:
+            storage.delete(key)
+        files += 1
+        reclaimed += size
+    if not dry_run:
+        # части незавершенных загрузок удалены вместе с остальными файлами
+        UploadRepository().delete_before(deadline.replace(tzinfo=None))
+        media_files_collected.inc(files)
+        media_bytes_reclaimed.inc(reclaimed)
+    app.logger.info('%s неиспользуемых файлов: %d, объем: %d байт',
+                    'Найдено' if dry_run else 'Удалено', files, reclaimed)
+    return {'files': files, 'bytes': reclaimed, 'dry_run': dry_run}
@@ -0,0 +1,45 @@
+"""Вспомогательные объекты для тестов и замеров производительности"""
+import socketserver
+import threading
+import time
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line: str):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        self.server.connections += 1
+        # задержка приветствия имитирует установку TCP- и TLS-соединения с удаленным сервером
+        time.sleep(self.server.latency)
+        self.reply('220 localhost SMTP sink')
+        for line in self.rfile:
+            command = line.decode().strip().upper()
+            if command.startswith(('EHLO', 'HELO')):
+                self.reply('250 localhost')
+            elif command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                for data in self.rfile:
+                    if data == b'.\r\n':
+                        break
+                self.server.messages += 1
+                self.reply('250 OK')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('250 OK')
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    """Локальный SMTP-сервер, принимающий и отбрасывающий письма"""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, latency: float = 0):
+        super().__init__(('127.0.0.1', 0), SMTPHandler)
+        self.latency = latency
+        self.connections = 0
+        self.messages = 0
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
@@ -0,0 +1,63 @@
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+from unittest import TestCase, main
+
+import requests
+
+from app import create_worker_app
+from app.metrics import start_metrics_server
+from app.smtp import DeliveryError, deliver, make_message
+from app.testing import SMTPSink
+from config import TestConfig
+
+
+class SMTPCase(TestCase):
+    def setUp(self):
+        self.app = create_worker_app(TestConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        self.sink = SMTPSink()
+        self.addCleanup(self.sink.server_close)
+        state = self.app.extensions['mail']
+        state.server, state.port = self.sink.server_address
+        state.suppress = False
+
+    def tearDown(self):
+        self.app_context.pop()
+
+    def test_smtp_pool(self):
+        for i in range(3):
+            deliver([make_message("Тест", "test@example.com", [f"user{i}@example.com"], "текст", "текст")])
+        self.assertEqual((self.sink.connections, self.sink.messages), (1, 3))
+        self.app.extensions.pop('smtp_pool')
+        self.sink.shutdown()
+        self.sink.server_close()
+        with self.assertRaises(DeliveryError):
+            deliver([make_message("Тест", "test@example.com", ["user@example.com"], "текст", "текст")])
+
+
+class MetricsCase(TestCase):
+    def test_worker_metrics(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        env = {**os.environ, 'PROMETHEUS_MULTIPROC_DIR': folder.name}
+        # значение, записанное дочерним процессом обработчика
+        subprocess.run([sys.executable, '-c', 'from app.metrics import media_files_collected; '
+                                              'media_files_collected.inc(3)'], env=env, check=True)
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+        os.environ['PROMETHEUS_MULTIPROC_DIR'] = folder.name
+        self.addCleanup(os.environ.pop, 'PROMETHEUS_MULTIPROC_DIR')
+        server = start_metrics_server(port)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        response = requests.get(f'http://127.0.0.1:{port}/metrics')
+        self.assertIn('flygram_media_files_collected_total 3.0', response.text)
+
+
+if __name__ == '__main__':
+    main(verbosity=2)
@@ -0,0 +1,92 @@
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime
+
+import sqlalchemy as sa
+from flask import abort, url_for
+
+from app import db
+from app.models import Upload, User
+
+
+class UploadRepositoryInterface(ABC):
+    @abstractmethod
+    def add(self, user: User, length: int, key: str | None = None) -> Upload:
+        """Новая загрузка, key - объект, который клиент загружает напрямую в хранилище"""
+        pass
+
+    @abstractmethod
+    def get_by_id(self, upload_id: uuid.UUID, user: User) -> Upload:
+        pass
+
+    @abstractmethod
+    def add_part(self, upload: Upload, offset: int, key: str, size: int, extension: str | None) -> bool:
+        """Добавление части, если смещение не изменилось, False - часть загружена параллельным запросом"""
+        pass
+
+    @abstractmethod
+    def complete(self, upload: Upload, url: str) -> None:
+        pass
+
+    @abstractmethod
+    def get_url(self, upload_id: uuid.UUID, user: User) -> str:
+        pass
+
+    @abstractmethod
+    def delete_before(self, date: datetime) -> int:
+        pass
+
+    @abstractmethod
+    def model_to_dict(self, upload: Upload) -> dict:
+        pass
+
+
+class UploadRepository(UploadRepositoryInterface):
+    def add(self, user: User, length: int, key: str | None = None) -> Upload:
+        upload = Upload(user_id=user.id, length=length, key=key,
+                        extension=key.rsplit('.', 1)[1] if key is not None else None)
+        db.session.add(upload)
+        db.session.commit()
+        return upload
+
+    def get_by_id(self, upload_id: uuid.UUID, user: User) -> Upload:
+        return db.first_or_404(sa.select(Upload).where(Upload.id == upload_id, Upload.user_id == user.id))
+
+    def add_part(self, upload: Upload, offset: int, key: str, size: int, extension: str | None) -> bool:
+        # строка блокируется, чтобы части параллельных запросов не перемешались
+        upload = db.session.scalar(sa.select(Upload).where(Upload.id == upload.id).with_for_update()
+                                   .execution_options(populate_existing=True))
+        if upload.offset != offset or upload.url is not None:
+            db.session.rollback()
+            return False
+        upload.parts = [*upload.parts, key]
+        upload.offset += size
+        if extension is not None:
+            upload.extension = extension
+        db.session.commit()
+        return True
+
+    def complete(self, upload: Upload, url: str) -> None:
+        upload.url = url
+        upload.parts = []
+        db.session.commit()
+
+    def get_url(self, upload_id: uuid.UUID, user: User) -> str:
+        upload = self.get_by_id(upload_id, user)
+        if upload.url is None:
+            abort(409, 'Загрузка файла не завершена')
+        return upload.url
+
+    def delete_before(self, date: datetime) -> int:
+        result = db.session.execute(sa.delete(Upload).where(Upload.created_at < date))
+        db.session.commit()
+        return result.rowcount
+
+    def model_to_dict(self, upload: Upload) -> dict:
+        return {
+            'id': str(upload.id),
+            'length': upload.length,
+            'offset': upload.offset,
+            'url': upload.url,
+            'links': {'self': url_for('upload', upload_id=upload.id)},
+        }
@@ -0,0 +1,8 @@
+from marshmallow import Schema, fields, validate
+
+
+class UploadSchema(Schema):
+    length = fields.Integer(required=True, strict=True, validate=[validate.Range(
+        min=1, error="Размер файла должен быть положительным")],
+                            error_messages={"required": "Укажите размер файла", "null": "Укажите размер файла",
+                                            "invalid": "Проверьте размер файла"})
@@ -0,0 +1,110 @@
+import io
+import uuid
+from abc import ABC, abstractmethod
+from typing import BinaryIO
+
+from flask import g, abort, current_app as app
+
+from app.images import detect_image_type
+from app.models import Upload
+from app.storage import get_storage, ConcatReader, HashingReader, CHUNK_SIZE
+from app.uploads.repository import UploadRepositoryInterface
+
+# расширение, которое detect_image_type возвращает для файла с другим допустимым расширением
+EXTENSION_ALIASES = {'jpeg': 'jpg'}
+
+
+class UploadServiceInterface(ABC):
+    upload_repository: UploadRepositoryInterface
+
+    @abstractmethod
+    def create_upload(self, length: int) -> dict:
+        pass
+
+    @abstractmethod
+    def get_upload(self, upload_id: uuid.UUID) -> dict:
+        pass
+
+    @abstractmethod
+    def append_chunk(self, upload_id: uuid.UUID, offset: int, stream: BinaryIO, size: int) -> dict:
+        pass
+
+    @abstractmethod
+    def finish_upload(self, upload_id: uuid.UUID) -> dict:
+        pass
+
+
+class UploadService(UploadServiceInterface):
+    def __init__(self, upload_repository: UploadRepositoryInterface):
+        self.upload_repository = upload_repository
+
+    def create_upload(self, length: int) -> dict:
+        if length > app.config['UPLOAD_MAX_LENGTH']:
+            abort(413)
+        upload: Upload = self.upload_repository.add(g.current_user, length)
+        return self.upload_repository.model_to_dict(upload)
+
+    def get_upload(self, upload_id: uuid.UUID) -> dict:
+        return self.upload_repository.model_to_dict(self.upload_repository.get_by_id(upload_id, g.current_user))
+
+    def append_chunk(self, upload_id: uuid.UUID, offset: int, stream: BinaryIO, size: int) -> dict:
+        """Запись очередной части файла в хранилище без буферизации в памяти"""
+        upload: Upload = self.upload_repository.get_by_id(upload_id, g.current_user)
+        if upload.url is not None or upload.key is not None or offset != upload.offset:
+            abort(409, 'Смещение не совпадает с загруженной частью файла')
+        if offset + size > upload.length:
+            abort(413)
+        stream = io.BufferedReader(stream, CHUNK_SIZE)
+        extension = None
+        if offset == 0:
+            # тип определяется по содержимому, имя и заголовки клиента не учитываются
+            extension = detect_image_type(stream.peek(16))
+            if extension not in app.config['ALLOWED_EXTENSIONS']:
+                abort(415)
+        storage = get_storage()
+        key = f'uploads/{upload.id}/{uuid.uuid4()}'
+        storage.write(key, stream)
+        if stream.tell() != size or not self.upload_repository.add_part(upload, offset, key, size, extension):
+            storage.delete(key)
+            abort(409, 'Смещение не совпадает с загруженной частью файла')
+        return self.upload_repository.model_to_dict(upload)
+
+    def finish_upload(self, upload_id: uuid.UUID) -> dict:
+        """Сборка частей в итоговый файл или проверка файла, загруженного напрямую в хранилище"""
+        upload: Upload = self.upload_repository.get_by_id(upload_id, g.current_user)
+        if upload.url is None and upload.key is not None:
+            self.verify_object(upload)
+            self.upload_repository.complete(upload, get_storage().url(upload.key))
+        elif upload.url is None:
+            if upload.offset != upload.length:
+                abort(409, 'Файл загружен не полностью')
+            storage = get_storage()
+            parts = upload.parts
+            key = storage.save(ConcatReader(storage, parts), upload.extension)
+            self.upload_repository.complete(upload, storage.url(key))
+            for part in parts:
+                storage.delete(part)
+        return self.upload_repository.model_to_dict(upload)
+
+    @staticmethod
+    def verify_object(upload: Upload) -> None:
+        """Проверка файла, загруженного клиентом напрямую в хранилище: размер, тип по содержимому и хеш из ключа"""
+        storage = get_storage()
+        if not storage.exists(upload.key):
+            abort(409, 'Файл не загружен')
+        with storage.open(upload.key) as source:
+            reader = HashingReader(source)
+            head = reader.read(16)
+            size = len(head)
+            while chunk := reader.read(CHUNK_SIZE):
+                size += len(chunk)
+        if reader.digest.hexdigest() != upload.key.rsplit('/', 1)[1].split('.')[0]:
+            # содержимое не соответствует ключу, такой объект помешал бы дедупликации
+            storage.delete(upload.key)
+            abort(422, 'Хеш файла не совпадает с заявленным')
+        if size != upload.length:
+            abort(413 if size > upload.length else 409, 'Размер файла не совпадает с заявленным')
+        extension = detect_image_type(head)
+        if extension not in app.config['ALLOWED_EXTENSIONS'] or extension != EXTENSION_ALIASES.get(
+                upload.extension, upload.extension):
+            abort(415)
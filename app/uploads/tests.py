@@ -0,0 +1,58 @@
+import io
+import tempfile
+import uuid
+from unittest import TestCase, main
+
+from flask import g
+from werkzeug.exceptions import Conflict, UnsupportedMediaType
+
+from app import create_app, db
+from app.models import User
+from app.storage import get_storage
+from app.uploads.repository import UploadRepository
+from app.uploads.service import UploadService
+from config import TestConfig
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"0" * 100
+
+
+class UploadModelCase(TestCase):
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        self.app_context = self.app.app_context()
+        self.service = UploadService(UploadRepository())
+        self.app_context.push()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_chunked_upload(self):
+        with self.app.test_request_context(), tempfile.TemporaryDirectory() as folder:
+            self.app.config['UPLOAD_FOLDER'] = folder
+            user: User = User(username="ivan", email="ivan@example.com", firstname="Иван", lastname="Петров")
+            db.session.add(user)
+            db.session.commit()
+            g.current_user = user
+            upload_id = uuid.UUID(self.service.create_upload(len(PNG))["id"])
+            with self.assertRaises(UnsupportedMediaType):
+                self.service.append_chunk(upload_id, 0, io.BytesIO(b"GIF00a" + PNG[6:50]), 50)
+            self.assertEqual(self.service.append_chunk(upload_id, 0, io.BytesIO(PNG[:50]), 50)["offset"], 50)
+            with self.assertRaises(Conflict):
+                self.service.append_chunk(upload_id, 0, io.BytesIO(PNG[:50]), 50)
+            with self.assertRaises(Conflict):
+                self.service.finish_upload(upload_id)
+            self.service.append_chunk(upload_id, 50, io.BytesIO(PNG[50:]), len(PNG) - 50)
+            result: dict = self.service.finish_upload(upload_id)
+            storage = get_storage()
+            with storage.open(storage.key(result["url"])) as file:
+                self.assertEqual(file.read(), PNG)
+            self.assertTrue(result["url"].endswith(".png"))
+            self.assertEqual([key for key, _, _ in storage.list()], [storage.key(result["url"])])
+            self.assertEqual(UploadRepository().get_url(upload_id, user), result["url"])
+
+
+if __name__ == '__main__':
+    main(verbosity=2)
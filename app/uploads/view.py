@@ -0,0 +1,62 @@
+import uuid
+
+from flask import request, abort
+from flask.views import MethodView
+from marshmallow import ValidationError
+
+from app.auth import token_auth
+from app.uploads.schema import UploadSchema
+from app.uploads.service import UploadServiceInterface
+
+
+def offset_headers(upload: dict) -> dict:
+    return {'Upload-Offset': str(upload['offset']), 'Upload-Length': str(upload['length']),
+            'Cache-Control': 'no-store'}
+
+
+class UploadsAPI(MethodView):
+    init_every_request = False
+    decorators = [token_auth.login_required]
+
+    service: UploadServiceInterface
+
+    def __init__(self, service: UploadServiceInterface):
+        self.service = service
+
+    def post(self):
+        """Начало загрузки файла по частям"""
+        try:
+            data = UploadSchema().load(request.get_json(silent=True) or {})
+        except ValidationError as err:
+            abort(422, err.messages)
+        upload: dict = self.service.create_upload(data['length'])
+        return upload, 201, {'Location': upload['links']['self'], **offset_headers(upload)}
+
+
+class UploadAPI(MethodView):
+    init_every_request = False
+    decorators = [token_auth.login_required]
+
+    service: UploadServiceInterface
+
+    def __init__(self, service: UploadServiceInterface):
+        self.service = service
+
+    def get(self, upload_id: uuid.UUID):
+        """Состояние загрузки, смещение для продолжения после обрыва соединения"""
+        upload: dict = self.service.get_upload(upload_id)
+        return upload, 200, offset_headers(upload)
+
+    def patch(self, upload_id: uuid.UUID):
+        """Загрузка очередной части файла, тело запроса читается потоком"""
+        offset = request.headers.get('Upload-Offset', type=int)
+        if offset is None:
+            abort(400)
+        if request.content_length is None:
+            abort(411)
+        upload: dict = self.service.append_chunk(upload_id, offset, request.stream, request.content_length)
+        return upload, 200, offset_headers(upload)
+
+    def put(self, upload_id: uuid.UUID):
+        """Завершение загрузки"""
+        return self.service.finish_upload(upload_id)
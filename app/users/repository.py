@@ -1,13 +1,79 @@
+import threading
+import time
 from abc import ABC, abstractmethod
 import sqlalchemy as sa
-from flask import g, url_for
+from flask import g, url_for, current_app as app
 from app.models import User, friends
 from app.utils import paginate
-from app import db
+from app import db, cache
+from app.images import get_image_links
 from datetime import datetime, timezone
 from app.users.utils import set_password
+from app.sync.repository import ChangeRepository
 import sqlalchemy.orm as so
 
+CACHED_FIELDS = ('username', 'email', 'firstname', 'lastname', 'avatar_url', 'avatar_renditions', 'verified_email',
+                 'two_factor_enabled')
+
+
+class LastSeenBufferInterface(ABC):
+    @abstractmethod
+    def add(self, user_id: int, last_seen: datetime) -> None:
+        pass
+
+    @abstractmethod
+    def pop_all(self) -> dict[int, datetime]:
+        pass
+
+
+class RedisLastSeenBuffer(LastSeenBufferInterface):
+    """Буфер времени последнего посещения в хеше Redis, общий для всех процессов"""
+    key = 'last_seen'
+
+    def __init__(self, interval: int):
+        self.interval = interval
+
+    def add(self, user_id: int, last_seen: datetime) -> None:
+        redis = app.extensions['redis']
+        if redis.set(f'{self.key}:lock:{user_id}', 1, nx=True, ex=self.interval):
+            redis.hset(self.key, str(user_id), last_seen.isoformat())
+
+    def pop_all(self) -> dict[int, datetime]:
+        pipeline = app.extensions['redis'].pipeline()
+        pipeline.hgetall(self.key)
+        pipeline.delete(self.key)
+        data, _ = pipeline.execute()
+        return {int(user_id): datetime.fromisoformat(value) for user_id, value in data.items()}
+
+
+class MemoryLastSeenBuffer(LastSeenBufferInterface):
+    """Буфер времени последнего посещения в памяти процесса"""
+
+    def __init__(self, interval: int):
+        self.interval = interval
+        self.data: dict[int, datetime] = {}
+        self.recorded: dict[int, float] = {}
+        self.lock = threading.Lock()
+
+    def add(self, user_id: int, last_seen: datetime) -> None:
+        now = time.monotonic()
+        with self.lock:
+            if now - self.recorded.get(user_id, -self.interval) >= self.interval:
+                self.recorded[user_id] = now
+                self.data[user_id] = last_seen
+
+    def pop_all(self) -> dict[int, datetime]:
+        with self.lock:
+            data, self.data = self.data, {}
+            return data
+
+
+def get_last_seen_buffer() -> LastSeenBufferInterface:
+    if 'last_seen_buffer' not in app.extensions:
+        buffers = {'redis': RedisLastSeenBuffer, 'memory': MemoryLastSeenBuffer}
+        app.extensions['last_seen_buffer'] = buffers[app.config['LAST_SEEN_BUFFER']](app.config['LAST_SEEN_INTERVAL'])
+    return app.extensions['last_seen_buffer']
+
 
 class UserRepositoryInterface(ABC):
     @abstractmethod
@@ -18,6 +84,14 @@ class UserRepositoryInterface(ABC):
     def get_by_id(self, user_id: int) -> User | None:
         pass
 
+    @abstractmethod
+    def get_cached_by_id(self, user_id: int) -> User | None:
+        pass
+
+    @abstractmethod
+    def get_reference(self, user_id: int, **fields) -> User:
+        pass
+
     @abstractmethod
     def get_users(self) -> list[User]:
         pass
@@ -48,6 +122,10 @@ class UserRepositoryInterface(ABC):
     def update_last_seen(self, user: User) -> None:
         pass
 
+    @abstractmethod
+    def flush_last_seen(self) -> int:
+        pass
+
     @abstractmethod
     def get_followers_without_friends(self, user: User) -> sa.Select[tuple[User]]:
         pass
@@ -80,6 +158,10 @@ class UserRepositoryInterface(ABC):
     def is_friend(self, user: User, friend: User) -> bool:
         pass
 
+    @abstractmethod
+    def get_friend_id(self, user_id: int, username: str) -> int | None:
+        pass
+
     @abstractmethod
     def follow(self, user: User, following: User) -> None:
         pass
@@ -100,6 +182,14 @@ class UserRepositoryInterface(ABC):
     def update_avatar_url(self, user: User, avatar_url: str) -> None:
         pass
 
+    @abstractmethod
+    def update_avatar_renditions(self, user: User, renditions: dict) -> None:
+        pass
+
+    @abstractmethod
+    def invalidate_cache(self, user: User) -> None:
+        pass
+
     @abstractmethod
     def verify_email(self, user: User) -> None:
         pass
@@ -121,6 +211,28 @@ class UserRepository(UserRepositoryInterface):
     def get_by_id(self, user_id: int) -> User | None:
         return db.session.get(User, user_id)
 
+    def get_cached_by_id(self, user_id: int) -> User | None:
+        """Получение пользователя из кэша основных полей без обращения к базе данных"""
+        data_key, version_key = f'user:{user_id}', f'user:{user_id}:version'
+        data, version = cache.get_many(data_key, version_key)
+        version = version or 0
+        if data is None or data.get('version') != version:
+            user = self.get_by_id(user_id)
+            if user:
+                cache.set(data_key, {'version': version, **{field: getattr(user, field) for field in CACHED_FIELDS}},
+                          timeout=app.config['USER_CACHE_TIMEOUT'])
+            return user
+        return self.get_reference(user_id, **{field: data[field] for field in CACHED_FIELDS})
+
+    def get_reference(self, user_id: int, **fields) -> User:
+        """Пользователь без запроса к базе данных, остальные поля загружаются при первом обращении"""
+        user = User(id=user_id, **fields)
+        so.make_transient_to_detached(user)
+        return db.session.merge(user, load=False)
+
+    def invalidate_cache(self, user: User) -> None:
+        cache.cache.inc(f'user:{user.id}:version')
+
     def add(self, data: dict, password: str) -> User:
         user: User = User(**data)
         set_password(user, password)
@@ -177,18 +289,38 @@ class UserRepository(UserRepositoryInterface):
         return db.session.scalar(query) is not None
 
     def is_friend(self, user: User, friend: User) -> bool:
-        return self.is_following(user, friend) and self.is_following(friend, user)
+        query = sa.select(sa.func.count()).select_from(friends).where(sa.or_(
+            sa.and_(friends.c.user_id == user.id, friends.c.friend_id == friend.id),
+            sa.and_(friends.c.user_id == friend.id, friends.c.friend_id == user.id)))
+        return db.session.scalar(query) == 2
+
+    def get_friend_id(self, user_id: int, username: str) -> int | None:
+        """Идентификатор друга по имени пользователя, поиск и проверка дружбы одним запросом"""
+        following = friends.alias()
+        follower = friends.alias()
+        query = (sa.select(User.id)
+                 .join(following, sa.and_(following.c.user_id == user_id, following.c.friend_id == User.id))
+                 .join(follower, sa.and_(follower.c.user_id == User.id, follower.c.friend_id == user_id))
+                 .where(User.username == username))
+        return db.session.scalar(query)
 
     def follow(self, user: User, following: User) -> None:
         if not self.is_following(user, following):
             user.following.add(following)
+            self.add_follow_change(user, following, 'created')
             db.session.commit()
 
     def unfollow(self, user: User, following: User) -> None:
         if self.is_following(user, following):
             user.following.remove(following)
+            self.add_follow_change(user, following, 'deleted')
             db.session.commit()
 
+    @staticmethod
+    def add_follow_change(user: User, following: User, action: str) -> None:
+        # подписка односторонняя, поэтому изменение записывается только подписчику
+        ChangeRepository().add([user.id], 'follow', following.id, action)
+
     def get_by_username_or_email(self, username: str, email: str, error: bool = True) -> User | None:
         query = sa.select(User).where(sa.or_(
             User.username == username, User.email == email)).limit(1)
@@ -210,6 +342,7 @@ class UserRepository(UserRepositoryInterface):
         user: User = self.get_by_username(username)
         db.session.delete(user)
         db.session.commit()
+        self.invalidate_cache(user)
 
     def get_by_email(self, email: str, error: bool = True) -> User | None:
         query = sa.select(User).where(User.email == email).limit(1)
@@ -220,14 +353,37 @@ class UserRepository(UserRepositoryInterface):
         return user
 
     def update_last_seen(self, user: User) -> None:
-        user.last_seen = datetime.now(timezone.utc)
+        get_last_seen_buffer().add(user.id, datetime.now(timezone.utc))
+
+    def flush_last_seen(self) -> int:
+        """Запись накопленного времени последнего посещения одним запросом"""
+        data = get_last_seen_buffer().pop_all()
+        if not data:
+            return 0
+        if db.engine.dialect.name == 'postgresql':
+            values = sa.values(sa.column('id', sa.Integer), sa.column('last_seen', sa.DateTime),
+                               name='last_seen_values').data(list(data.items()))
+            db.session.execute(sa.update(User).where(User.id == values.c.id).values(last_seen=values.c.last_seen),
+                               execution_options={'synchronize_session': False})
+        else:
+            db.session.execute(sa.update(User), [{'id': user_id, 'last_seen': last_seen}
+                                                 for user_id, last_seen in data.items()])
         db.session.commit()
+        return len(data)
 
     def update_avatar_url(self, user: User, avatar_url: str) -> None:
         user.avatar_url = avatar_url
+        user.avatar_renditions = None
+        db.session.commit()
+        self.invalidate_cache(user)
+
+    def update_avatar_renditions(self, user: User, renditions: dict) -> None:
+        user.avatar_renditions = renditions
         db.session.commit()
+        self.invalidate_cache(user)
 
     def model_to_dict(self, model: User) -> dict:
+        avatar, srcset = get_image_links(model.avatar_url, model.avatar_renditions)
         data: dict = {
             'username': model.username,
             'firstname': model.firstname,
@@ -252,26 +408,31 @@ class UserRepository(UserRepositoryInterface):
             'two_factor_enabled': model.two_factor_enabled,
             'links': {
                 'self': url_for('user', username=model.username),
-                'avatar': model.avatar_url
+                'avatar': avatar,
+                'srcset': srcset
             }
         }
         return data
 
     def update_model_from_dict(self, model: User, data: dict) -> None:
         for field in ['username', 'email', 'firstname', 'lastname', 'phone_number', 'date_birth', 'city',
-                      'address', 'education', 'career', 'skills', 'hobbies', 'two_factor_code']:
+                      'address', 'education', 'career', 'skills', 'hobbies']:
             if field in data:
                 setattr(model, field, data[field])
         db.session.commit()
+        self.invalidate_cache(model)
 
     def verify_email(self, user: User) -> None:
         user.verified_email = True
         db.session.commit()
+        self.invalidate_cache(user)
 
     def enable_two_factor(self, user: User) -> None:
         user.two_factor_enabled = True
         db.session.commit()
+        self.invalidate_cache(user)
 
     def disable_two_factor(self, user: User) -> None:
         user.two_factor_enabled = False
         db.session.commit()
+        self.invalidate_cache(user)
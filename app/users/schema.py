@@ -135,3 +135,4 @@ class UserUpdateSchema(UserSchema):
         error_messages={"required": "Введите Вашу фамилию",
                         "null": "Введите Вашу фамилию", "invalid": "Проверьте фамилию"}
     )
+    upload_id = fields.UUID(error_messages={"invalid": "Проверьте загруженный файл"})
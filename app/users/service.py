@@ -1,10 +1,8 @@
 import math
-import os
 from abc import ABC, abstractmethod
-from hashlib import md5
 
-from flask import g, current_app as app, abort
-from werkzeug.utils import secure_filename
+from flask import g, abort
+from werkzeug.datastructures import FileStorage
 
 from app.auth.repository import SessionRepositoryInterface
 from app.models import User, Vacancy
@@ -12,6 +10,9 @@ from app.users.repository import UserRepositoryInterface
 from app.users.utils import check_password, set_password
 from app.utils import get_similarity_vector
 from app import db
+from app.storage import save_upload
+from app.tasks import process_image
+from app.uploads.repository import UploadRepositoryInterface
 
 SUBSCRIPTION_WEIGHT = 3
 SAME_ATTRIBUTES_WEIGHT = 2
@@ -23,6 +24,7 @@ SKILL_WEIGHT = 5
 class UserServiceInterface(ABC):
     session_repository: SessionRepositoryInterface
     users_repository: UserRepositoryInterface
+    upload_repository: UploadRepositoryInterface
 
     @abstractmethod
     def get_user(self, username: str) -> dict:
@@ -45,7 +47,7 @@ class UserServiceInterface(ABC):
         pass
 
     @abstractmethod
-    def upload_avatar(self, user: User, file) -> None:
+    def upload_avatar(self, user: User, file: FileStorage | str) -> None:
         pass
 
     @abstractmethod
@@ -78,8 +80,9 @@ class UserServiceInterface(ABC):
 
 
 class UserService(UserServiceInterface):
-    def __init__(self, users_repository: UserRepositoryInterface):
+    def __init__(self, users_repository: UserRepositoryInterface, upload_repository: UploadRepositoryInterface):
         self.users_repository = users_repository
+        self.upload_repository = upload_repository
 
     def get_user(self, username: str) -> dict:
         if username == 'current':
@@ -177,25 +180,23 @@ class UserService(UserServiceInterface):
             if user_exist:
                 abort(422, 'Пользователь с таким email уже существует')
         avatar = data.get("avatar")
+        upload_id = data.pop("upload_id", None)
+        if upload_id:
+            avatar = self.upload_repository.get_url(upload_id, g.current_user)
         if avatar:
             self.upload_avatar(user, avatar)
-            del data["avatar"]
+            data.pop("avatar", None)
         for key, value in data.items():
             if type(value) is str:
                 data[key] = value.strip()
         self.users_repository.update_model_from_dict(user, data)
         return self.users_repository.model_to_dict(user)
 
-    def upload_avatar(self, user: User, file) -> None:
-        filename = secure_filename(file.filename)
-        extension = filename.rsplit('.', 1)[1].lower()
-        filename = f'{md5(user.username.encode('utf-8')).hexdigest()}.{extension}'
-        avatar_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        if not os.path.exists(app.config['UPLOAD_FOLDER']):
-            os.mkdir(app.config['UPLOAD_FOLDER'])
-        file.save(avatar_path)
-        avatar_url: str = f'/static/images/{filename}'
+    def upload_avatar(self, user: User, file: FileStorage | str) -> None:
+        """Установка аватара из файла запроса или по ссылке на завершенную загрузку"""
+        avatar_url: str = save_upload(file) if isinstance(file, FileStorage) else file
         self.users_repository.update_avatar_url(user, avatar_url)
+        process_image.delay('user', user.id, avatar_url)
 
     def add_user(self, data: dict) -> dict:
         user_exist = self.users_repository.get_by_username_or_email(data["username"], data["email"], False)
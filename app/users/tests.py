@@ -1,10 +1,12 @@
 import os
 from unittest import TestCase, main
 
+import sqlalchemy as sa
 from flask import g
 
 from app import create_app, db
 from app.models import User
+from app.uploads.repository import UploadRepository
 from app.users.repository import UserRepository
 from app.users.service import UserService
 from app.users.utils import set_password, check_password
@@ -15,7 +17,7 @@ class UserModelCase(TestCase):
     def setUp(self):
         self.app = create_app(TestConfig)
         self.app_context = self.app.app_context()
-        self.service = UserService(UserRepository())
+        self.service = UserService(UserRepository(), UploadRepository())
         self.app_context.push()
         db.create_all()
 
@@ -184,6 +186,63 @@ class UserModelCase(TestCase):
             user1_friends: dict = self.service.get_friends("ivan", {}, 1, 3, None)
             self.assertEqual(len(user1_friends["items"]), 0)
 
+    def test_is_friend(self):
+        user1: User = User(username="ivan", email="ivan@example.com", firstname="Иван", lastname="Петров")
+        user2: User = User(username="petr", email="petr@example.com", firstname="Петр", lastname="Иванов")
+        user1.following.add(user2)
+        db.session.add_all([user1, user2])
+        db.session.commit()
+        repo = UserRepository()
+        self.assertFalse(repo.is_friend(user1, user2))
+        self.assertIsNone(repo.get_friend_id(user1.id, "petr"))
+        user2.following.add(user1)
+        db.session.commit()
+        self.assertTrue(repo.is_friend(user1, user2))
+        self.assertTrue(repo.is_friend(user2, user1))
+        self.assertEqual(repo.get_friend_id(user1.id, "petr"), user2.id)
+        self.assertIsNone(repo.get_friend_id(user1.id, "alex"))
+
+    def test_get_cached_by_id(self):
+        with self.app.app_context(), self.app.test_request_context():
+            repo = UserRepository()
+            user: User = User(username="ivan", email="ivan@example.com", firstname="Иван", lastname="Петров")
+            set_password(user, "123123123")
+            db.session.add(user)
+            db.session.commit()
+            repo.get_cached_by_id(user.id)
+            db.session.remove()
+            statements = []
+            sa.event.listen(db.engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+            cached: User = repo.get_cached_by_id(1)
+            self.assertEqual(cached.id, 1)
+            self.assertEqual(cached.username, "ivan")
+            self.assertFalse(cached.two_factor_enabled)
+            self.assertEqual(statements, [])
+            repo.update_model_from_dict(cached, {"firstname": "Петр"})
+            db.session.remove()
+            self.assertEqual(repo.get_cached_by_id(1).firstname, "Петр")
+            self.assertEqual(repo.get_cached_by_id(1).username, "ivan")
+            self.service.delete_user("ivan")
+            self.assertIsNone(repo.get_cached_by_id(1))
+
+    def test_flush_last_seen(self):
+        with self.app.app_context(), self.app.test_request_context():
+            repo = UserRepository()
+            user: User = User(username="ivan", email="ivan@example.com", firstname="Иван", lastname="Петров")
+            set_password(user, "123123123")
+            db.session.add(user)
+            db.session.commit()
+            last_seen = user.last_seen
+            repo.update_last_seen(user)
+            repo.update_last_seen(user)
+            db.session.refresh(user)
+            self.assertEqual(user.last_seen, last_seen)
+            self.assertEqual(repo.flush_last_seen(), 1)
+            db.session.refresh(user)
+            self.assertGreater(user.last_seen, last_seen)
+            repo.update_last_seen(user)
+            self.assertEqual(repo.flush_last_seen(), 0)
+
 
 if __name__ == '__main__':
     main(verbosity=2)
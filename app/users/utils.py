@@ -1,12 +1,35 @@
+import sys
+from functools import lru_cache
+
+from flask import current_app as app
 from werkzeug.security import generate_password_hash, check_password_hash
 from app import db
 from app.models import User
 
 
+def run_blocking(func, *args):
+    """Выполнение ресурсоемкой функции в потоке ОС, чтобы не блокировать цикл событий eventlet"""
+    # eventlet загружен только в процессе веб-сервера, обработчикам задач он не нужен
+    patcher = sys.modules.get('eventlet.patcher')
+    if patcher is not None and patcher.is_monkey_patched('thread'):
+        from eventlet import tpool
+        return tpool.execute(func, *args)
+    return func(*args)
+
+
+@lru_cache
+def get_hash_prefix(method: str) -> str:
+    return generate_password_hash('', method).split('$', 1)[0]
+
+
 def set_password(user: User, password: str):
-    user.password_hash = generate_password_hash(password)
+    user.password_hash = run_blocking(generate_password_hash, password, app.config['PASSWORD_HASH_METHOD'])
     db.session.commit()
 
 
 def check_password(user: User, password: str):
-    return check_password_hash(user.password_hash, password)
+    return run_blocking(check_password_hash, user.password_hash, password)
+
+
+def needs_rehash(user: User) -> bool:
+    return user.password_hash.split('$', 1)[0] != get_hash_prefix(app.config['PASSWORD_HASH_METHOD'])
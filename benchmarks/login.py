@@ -0,0 +1,71 @@
+"""Задержка входа и отзывчивость цикла событий eventlet при параллельной проверке паролей
+
+Запуск: python -m benchmarks.login [--concurrency 50] [--requests 200] [--inline]
+"""
+import eventlet
+
+eventlet.monkey_patch()
+
+import argparse
+import statistics
+import time
+
+from app import create_app
+from app.models import User
+from app.users import utils
+from config import TestConfig
+
+
+def percentile(values: list[float], q: int) -> float:
+    return statistics.quantiles(values, n=100)[q - 1] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--method', default='scrypt')
+    parser.add_argument('--inline', action='store_true', help='проверять пароль в цикле событий, без tpool')
+    args = parser.parse_args()
+    if args.inline:
+        utils.run_blocking = lambda func, *func_args: func(*func_args)
+
+    app = create_app(TestConfig)
+    app.config['PASSWORD_HASH_METHOD'] = args.method
+    with app.app_context():
+        user = User(username='benchmark')
+        user.password_hash = utils.generate_password_hash('123123123', args.method)
+
+        logins: list[float] = []
+        stalls: list[float] = []
+        running = True
+
+        def login(start: float):
+            utils.check_password(user, '123123123')
+            logins.append(time.perf_counter() - start)
+
+        def heartbeat():
+            while running:
+                start = time.perf_counter()
+                eventlet.sleep(0.01)
+                stalls.append(time.perf_counter() - start - 0.01)
+
+        probe = eventlet.spawn(heartbeat)
+        pool = eventlet.GreenPool(args.concurrency)
+        start = time.perf_counter()
+        for _ in range(args.requests):
+            pool.spawn_n(login, time.perf_counter())
+        pool.waitall()
+        elapsed = time.perf_counter() - start
+        running = False
+        probe.wait()
+
+    print(f"mode={'inline' if args.inline else 'tpool'} method={args.method} "
+          f"concurrency={args.concurrency} requests={args.requests}")
+    print(f"throughput: {args.requests / elapsed:.1f} logins/s")
+    print(f"login latency p50={percentile(logins, 50):.1f}ms p99={percentile(logins, 99):.1f}ms")
+    print(f"event loop stall p50={percentile(stalls, 50):.1f}ms p99={percentile(stalls, 99):.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
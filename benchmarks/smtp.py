@@ -0,0 +1,48 @@
+"""Отправка писем с новым SMTP-соединением на каждое письмо и через пул соединений
+
+Запуск: python -m benchmarks.smtp [--messages 200] [--latency 20]
+"""
+import argparse
+import time
+
+from app import create_app, mail
+from app.smtp import deliver, make_message
+from app.testing import SMTPSink
+from config import TestConfig
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=20, help='задержка установки соединения, мс')
+    args = parser.parse_args()
+
+    sink = SMTPSink(args.latency / 1000)
+    app = create_app(TestConfig)
+    state = app.extensions['mail']
+    state.server, state.port = sink.server_address
+    state.use_tls = state.use_ssl = state.suppress = False
+    with app.app_context():
+        messages = [make_message('Тест', 'bench@example.com', [f'user{i}@example.com'], 'текст', '<p>текст</p>')
+                    for i in range(args.messages)]
+        results = {}
+        modes = {
+            'connect-per-message': lambda: [mail.send(msg) for msg in messages],
+            'pooled': lambda: [deliver([msg]) for msg in messages],
+            'batch': lambda: deliver(messages),
+        }
+        for name, run in modes.items():
+            sink.connections = 0
+            app.extensions.pop('smtp_pool', None)
+            start = time.perf_counter()
+            run()
+            results[name] = (time.perf_counter() - start, sink.connections)
+
+    print(f'messages={args.messages} connect latency={args.latency:.0f}ms')
+    for name, (elapsed, connections) in results.items():
+        print(f'{name:>20}: {args.messages / elapsed:8.1f} msg/s, connections={connections}')
+    sink.shutdown()
+
+
+if __name__ == '__main__':
+    main()
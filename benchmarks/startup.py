@@ -0,0 +1,44 @@
+"""Время запуска и память процесса для точек входа веб-приложения (main) и обработчика задач (worker)
+
+Запуск: python -m benchmarks.startup [--runs 5]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+# импорт точки входа и загрузка модулей задач, как при старте обработчика Celery
+PROBE = '''
+import resource, sys, time
+start = time.perf_counter()
+import {entrypoint}
+{entrypoint}.celery_app.loader.import_default_modules()
+elapsed = time.perf_counter() - start
+print(elapsed, len(sys.modules), resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+'''
+
+
+def measure(entrypoint: str) -> tuple[float, int, int]:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = {**os.environ, 'PYTHONPATH': root}
+    env.setdefault('DATABASE_URL', 'sqlite://')
+    output = subprocess.run([sys.executable, '-c', PROBE.format(entrypoint=entrypoint)], env=env,
+                            cwd=root, check=True, capture_output=True, text=True).stdout.split()
+    return float(output[0]), int(output[1]), int(output[2])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    for entrypoint in ('main', 'worker'):
+        results = [measure(entrypoint) for _ in range(args.runs)]
+        elapsed = statistics.median(result[0] for result in results)
+        print(f'{entrypoint:>8}: {elapsed * 1000:7.1f} ms, modules={results[0][1]}, '
+              f'max rss={statistics.median(result[2] for result in results) / 1024:6.1f} MiB')
+
+
+if __name__ == '__main__':
+    main()
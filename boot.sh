@@ -8,4 +8,4 @@ flask db migrate
 
 flask db upgrade
 
-exec gunicorn -b :5000 --worker-class eventlet -w 1 --access-logfile - --error-logfile - main:app
\ No newline at end of file
+exec gunicorn -c gunicorn.conf.py main:app
\ No newline at end of file
@@ -4,7 +4,18 @@
 cd src
 
 if [[ "${1}" == "celery" ]]; then
-  celery --app=main.celery_app worker -l INFO
+  # значения метрик предыдущего запуска обработчика удаляются
+  if [[ -n "${PROMETHEUS_MULTIPROC_DIR}" ]]; then
+    rm -rf "${PROMETHEUS_MULTIPROC_DIR}" && mkdir -p "${PROMETHEUS_MULTIPROC_DIR}"
+  fi
+  # второй аргумент - очереди через запятую, по умолчанию обрабатываются все очереди из CELERY_QUEUES
+  if [[ -n "${2}" ]]; then
+    celery --app=worker.celery_app worker -l INFO -Q "${2}" -n "${2}@%h"
+  else
+    celery --app=worker.celery_app worker -l INFO
+  fi
+elif [[ "${1}" == "beat" ]]; then
+  celery --app=worker.celery_app beat -l INFO
 elif [[ "${1}" == "flower" ]]; then
-  celery --app=main.celery_app flower
+  celery --app=worker.celery_app flower
 fi
@@ -1,5 +1,6 @@
 import logging
 import os
+import tempfile
 from logging.handlers import RotatingFileHandler, SMTPHandler
 
 from dotenv import load_dotenv
@@ -12,7 +13,25 @@ class BaseConfig:
     APP_NAME = os.environ.get('APP_NAME', 'flygram')
     SECRET_KEY = os.environ.get('SECRET_KEY', 'secret-key')
     SESSION_LIFETIME = int(os.environ.get('SESSION_LIFETIME') or 30)
+    SESSION_STORE = os.environ.get('SESSION_STORE', 'sql')
+    SESSION_REAPER_INTERVAL = int(os.environ.get('SESSION_REAPER_INTERVAL') or 3600)
+    SESSION_REAPER_BATCH_SIZE = int(os.environ.get('SESSION_REAPER_BATCH_SIZE') or 1000)
+    SESSION_REAPER_MAX_BATCHES = int(os.environ.get('SESSION_REAPER_MAX_BATCHES') or 100)
+    # порт HTTP-сервера метрик Prometheus в обработчике задач, 0 - метрики не отдаются
+    METRICS_PORT = int(os.environ.get('METRICS_PORT') or 0)
+    CELERY_BROKER_POOL_LIMIT = int(os.environ.get('CELERY_BROKER_POOL_LIMIT') or 10)
+    CELERY_BROKER_MAX_CONNECTIONS = int(os.environ.get('CELERY_BROKER_MAX_CONNECTIONS') or 20)
+    # очереди задач в порядке приоритета и число процессов обработчика на каждую
+    CELERY_QUEUES = {
+        'auth-critical': int(os.environ.get('CELERY_AUTH_CRITICAL_CONCURRENCY') or 4),
+        'default': int(os.environ.get('CELERY_DEFAULT_CONCURRENCY') or 2),
+        'recommendations': int(os.environ.get('CELERY_RECOMMENDATIONS_CONCURRENCY') or 2),
+        'email-bulk': int(os.environ.get('CELERY_EMAIL_BULK_CONCURRENCY') or 2),
+        'maintenance': int(os.environ.get('CELERY_MAINTENANCE_CONCURRENCY') or 1),
+    }
     TOKEN_LIFETIME = int(os.environ.get('TOKEN_LIFETIME') or 10)
+    AUTH_MODE = os.environ.get('AUTH_MODE', 'user')
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
     PASSWORD_TOKEN_LIFETIME = int(os.environ.get('PASSWORD_TOKEN_LIFETIME') or 600)
     EMAIL_TOKEN_LIFETIME = int(os.environ.get('EMAIL_TOKEN_LIFETIME') or 600)
 
@@ -22,6 +41,10 @@ class BaseConfig:
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER')
+    MAIL_POOL_SIZE = int(os.environ.get('MAIL_POOL_SIZE') or 2)
+    MAIL_KEEPALIVE = int(os.environ.get('MAIL_KEEPALIVE') or 30)
+    MAIL_RETRY_BACKOFF = int(os.environ.get('MAIL_RETRY_BACKOFF') or 5)
+    MAIL_RETRY_BACKOFF_MAX = int(os.environ.get('MAIL_RETRY_BACKOFF_MAX') or 300)
     ADMINS = ['develop.nikita@yandex.ru']
 
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///' + os.path.join(basedir, 'app.db'))
@@ -31,14 +54,58 @@ class BaseConfig:
     UPLOAD_FOLDER = os.path.join(basedir, 'app', 'static', os.environ.get('UPLOAD_FOLDER') or 'images')
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
     MAX_CONTENT_LENGTH = 5 * 1024 * 1024
+    UPLOAD_MAX_LENGTH = int(os.environ.get('UPLOAD_MAX_LENGTH') or 20 * 1024 * 1024)
+    STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'filesystem')
+    S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL')
+    S3_REGION = os.environ.get('S3_REGION')
+    S3_BUCKET = os.environ.get('S3_BUCKET')
+    S3_ACCESS_KEY = os.environ.get('S3_ACCESS_KEY')
+    S3_SECRET_KEY = os.environ.get('S3_SECRET_KEY')
+    S3_PUBLIC_URL = os.environ.get('S3_PUBLIC_URL', '')
+    S3_PRESIGN_EXPIRES = int(os.environ.get('S3_PRESIGN_EXPIRES') or 600)
+    IMAGE_CACHE_FOLDER = os.environ.get('IMAGE_CACHE_FOLDER') or os.path.join(tempfile.gettempdir(), 'flygram')
+    IMAGE_CACHE_SIZE = int(os.environ.get('IMAGE_CACHE_SIZE') or 512 * 1024 * 1024)
+    # допустимые w и h для копий по запросу, по умолчанию - размеры копий из app.images.RENDITIONS
+    IMAGE_SIZES = frozenset(int(size) for size in (os.environ.get('IMAGE_SIZES') or '160,640,1600').split(','))
+    MEDIA_GC_INTERVAL = int(os.environ.get('MEDIA_GC_INTERVAL') or 86400)
+    MEDIA_GC_GRACE = int(os.environ.get('MEDIA_GC_GRACE') or 86400)
+    MEDIA_GC_BATCH_SIZE = int(os.environ.get('MEDIA_GC_BATCH_SIZE') or 1000)
+    MEDIA_GC_DRY_RUN = os.environ.get('MEDIA_GC_DRY_RUN') is not None
 
     CACHE_TYPE = 'redis'
     CACHE_IGNORE_ERRORS = False
     CACHE_REDIS_URL = os.environ.get('REDIS_URL')
     REDIS_PASSWORD = os.environ.get('REDIS_PASSWORD')
+    SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE')
+    SOCKETIO_CHANNEL = os.environ.get('SOCKETIO_CHANNEL', 'flask-socketio')
+    USER_CACHE_TIMEOUT = int(os.environ.get('USER_CACHE_TIMEOUT') or 300)
+    LAST_SEEN_BUFFER = os.environ.get('LAST_SEEN_BUFFER', 'redis')
+    LAST_SEEN_INTERVAL = int(os.environ.get('LAST_SEEN_INTERVAL') or 60)
+    MESSAGE_QUEUE = os.environ.get('MESSAGE_QUEUE', 'redis')
+    MESSAGE_BATCH_SIZE = int(os.environ.get('MESSAGE_BATCH_SIZE') or 500)
+    MESSAGE_BATCH_INTERVAL = int(os.environ.get('MESSAGE_BATCH_INTERVAL') or 100)
+    MESSAGE_ID_BLOCK = int(os.environ.get('MESSAGE_ID_BLOCK') or 100)
+    SYNC_LIMIT = int(os.environ.get('SYNC_LIMIT') or 1000)
+    SYNC_RETENTION = int(os.environ.get('SYNC_RETENTION') or 30)
+    SYNC_PRUNE_INTERVAL = int(os.environ.get('SYNC_PRUNE_INTERVAL') or 86400)
+    SYNC_PRUNE_BATCH_SIZE = int(os.environ.get('SYNC_PRUNE_BATCH_SIZE') or 1000)
+    SYNC_PRUNE_MAX_BATCHES = int(os.environ.get('SYNC_PRUNE_MAX_BATCHES') or 100)
+
+    RATELIMIT_ENABLED = os.environ.get('RATELIMIT_DISABLED') is None
+    RATELIMIT_BACKEND = os.environ.get('RATELIMIT_BACKEND', 'redis')
+    RATELIMITS = {
+        'login': (10, 60),
+        'refresh': (30, 60),
+        'two_factor': (5, 300),
+        'password': (5, 600),
+        'email': (5, 600),
+    }
 
     TWO_FACTOR_MIN_CODE = int(os.environ.get('TWO_FACTOR_MIN_CODE') or 1000)
     TWO_FACTOR_MAX_CODE = int(os.environ.get('TWO_FACTOR_MAX_CODE') or 9999)
+    TWO_FACTOR_STORE = os.environ.get('TWO_FACTOR_STORE', 'redis')
+    TWO_FACTOR_CODE_LIFETIME = int(os.environ.get('TWO_FACTOR_CODE_LIFETIME') or 300)
+    TWO_FACTOR_MAX_ATTEMPTS = int(os.environ.get('TWO_FACTOR_MAX_ATTEMPTS') or 5)
 
     VK_OAUTH2_ID = os.environ.get('VK_OAUTH2_ID')
     VK_OAUTH2_KEY = os.environ.get('VK_OAUTH2_KEY')
@@ -58,6 +125,12 @@ class TestConfig(BaseConfig):
     DEVELOPMENT = False
     SQLALCHEMY_DATABASE_URI = "sqlite+pysqlite:///:memory:"
     ELASTICSEARCH_URL = None
+    CACHE_TYPE = 'SimpleCache'
+    LAST_SEEN_BUFFER = 'memory'
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1000'
+    RATELIMIT_BACKEND = 'memory'
+    TWO_FACTOR_STORE = 'memory'
+    MESSAGE_QUEUE = 'sync'
 
 
 class DevelopmentConfig(BaseConfig):
@@ -0,0 +1,26 @@
+import os
+
+bind = os.environ.get('GUNICORN_BIND', ':5000')
+worker_class = 'eventlet'
+# Без message_queue и sticky-сессий Socket.IO работает только с одним процессом,
+# при нескольких процессах клиенты должны подключаться только через websocket
+workers = int(os.environ.get('WEB_WORKERS') or 1)
+preload_app = os.environ.get('GUNICORN_PRELOAD') is not None
+accesslog = '-'
+errorlog = '-'
+
+
+def post_fork(server, worker):
+    if server.cfg.preload_app:
+        from app import db
+        from main import app
+        with app.app_context():
+            db.engine.dispose(close=False)
+
+
+def post_worker_init(worker):
+    # фоновая запись сообщений запускается сразу, а не при первом сообщении процесса, чтобы подобрать
+    # неподтвержденные сообщения завершившихся процессов
+    from app.messages.repository import get_message_queue
+    with worker.wsgi.app_context():
+        get_message_queue()
@@ -3,6 +3,7 @@ from typing import Any
 from app import create_app, socketio, db
 import sqlalchemy as sa
 import sqlalchemy.orm as so
+from app.messages.repository import get_message_queue
 from app.models import User, Post, Community, Comment, Vacancy, Message, Session
 
 app = create_app()
@@ -22,4 +23,6 @@ def recreate_db() -> None:
 
 
 if __name__ == '__main__':
+    with app.app_context():
+        get_message_queue()
     socketio.run(app, debug=True, allow_unsafe_werkzeug=True)
@@ -0,0 +1,31 @@
+"""add message conversation index
+
+Revision ID: 8d2c4e91f0b6
+Revises: 3b8f61d2c7a4
+Create Date: 2026-10-19 21:03:27.408815
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d2c4e91f0b6'
+down_revision = '3b8f61d2c7a4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    with op.get_context().autocommit_block():
+        op.create_index('ix_message_conversation_date_id', 'message',
+                        [sa.text('least(sender_id, recipient_id)'), sa.text('greatest(sender_id, recipient_id)'),
+                         'date', 'id'], unique=False, postgresql_concurrently=True)
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.drop_index('ix_message_conversation_date_id', table_name='message')
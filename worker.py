@@ -0,0 +1,4 @@
+from app import create_worker_app
+
+app = create_worker_app()
+celery_app = app.extensions["celery"]